@@ -0,0 +1,124 @@
+"""
+asv benchmarks: time and peak memory of the main pydwcviz operations on synthetic
+Darwin Core data, tracked across releases.
+
+Run with ``asv run`` or compare two commits with ``asv continuous main HEAD``.
+Scales are powers of ten set by ``PYDWCVIZ_BENCH_SCALES`` (default "4,5,6");
+"4,5,6,7,8" covers 10^4 to 10^8 records. Diversity indices stream scales above
+10^7 through ``synthetic.chunks`` so the generated data itself stays bounded.
+"""
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from pydwcviz import diversity, map, schema, synthetic, taxon
+
+scales = [10**int(s) for s in os.environ.get("PYDWCVIZ_BENCH_SCALES", "4,5,6").split(",")]
+# plotting a few million records is already minutes, keep figures to smaller scales
+plot_scales = [n for n in scales if n <= 10**6]
+in_memory = 10**7
+
+class Diversity:
+    params = [scales]
+    param_names = ["records"]
+    timeout = 3600
+
+    def setup(self, n):
+        self.n = n
+        self.data = None if n > in_memory else synthetic.occurrences(n, seed=42)
+
+    def _records(self):
+        """The in-memory DataFrame, or a fresh chunk stream above ``in_memory`` records."""
+        if self.data is None:
+            return synthetic.chunks(self.n, chunksize=in_memory, seed=42)
+        return self.data
+
+    def time_shannon(self, n):
+        diversity.shannon(self._records(), 1)
+
+    def peakmem_shannon(self, n):
+        diversity.shannon(self._records(), 1)
+
+    def time_es50(self, n):
+        diversity.es50(self._records(), 1)
+
+    def peakmem_es50(self, n):
+        diversity.es50(self._records(), 1)
+
+    def time_shannon_ci(self, n):
+        diversity.shannon(self._records(), 1, ci=0.95, replicates=200, seed=42)
+
+    def time_beta_neighbours(self, n):
+        diversity.beta(self._records(), decimals=1, k=8)
+
+    def peakmem_beta_neighbours(self, n):
+        diversity.beta(self._records(), decimals=1, k=8)
+
+class Taxon:
+    params = [plot_scales]
+    param_names = ["records"]
+    timeout = 1800
+
+    def setup(self, n):
+        self.data = synthetic.occurrences(n, seed=42)
+
+    def teardown(self, n):
+        plt.close("all")
+
+    def time_latdist(self, n):
+        taxon.latdist(self.data, level="family")
+
+    def peakmem_latdist(self, n):
+        taxon.latdist(self.data, level="family")
+
+    def time_latdist_species(self, n):
+        taxon.latdist(self.data, level="species")
+
+    def time_latcounts(self, n):
+        taxon.latcounts(self.data, level="species", top=20)
+
+    def time_plot_dist(self, n):
+        taxon.plot_dist(self.data)
+
+    def peakmem_plot_dist(self, n):
+        taxon.plot_dist(self.data)
+
+class Map:
+    params = [plot_scales, ["points", "density"]]
+    param_names = ["records", "kind"]
+    timeout = 1800
+
+    def setup(self, n, kind):
+        self.data = synthetic.occurrences(n, seed=42)
+
+    def teardown(self, n, kind):
+        plt.close("all")
+
+    def time_points(self, n, kind):
+        map.points(self.data, kind=kind)
+
+    def peakmem_points(self, n, kind):
+        map.points(self.data, kind=kind)
+
+class Schema:
+    params = [[n for n in scales if n <= in_memory]]
+    param_names = ["records"]
+    timeout = 1800
+
+    def setup(self, n):
+        self.data = synthetic.occurrences(n, seed=42)
+        self.compact = schema.normalize(self.data)
+
+    def time_normalize(self, n):
+        schema.normalize(self.data)
+
+    def track_memory_ratio(self, n):
+        return self.data.memory_usage(deep=True).sum() / self.compact.memory_usage(deep=True).sum()
+
+    def time_shannon_compact(self, n):
+        diversity.shannon(self.compact, 1)
+
+    def time_latdist_compact(self, n):
+        taxon.latcounts(self.compact, level="species")
@@ -0,0 +1,161 @@
+"""
+cache: persistent on-disk cache for API responses.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from .utils import canonical_key
+
+default_path = os.path.join(os.path.expanduser("~"), ".cache", "pydwcviz", "responses.sqlite")
+
+class ResponseCache:
+    """
+    SQLite backed cache of API responses keyed by URL and normalized query parameters.
+
+    :param path: [String] Path of the SQLite database file.
+    :param ttl: [Float] Seconds a stored response is served without asking the API again.
+    :param ttls: [Dict] Per endpoint TTLs, e.g. ``{"/statistics/years": 86400}``. The longest
+        matching path prefix wins over ``ttl``.
+    :param max_size: [Integer] Maximum total size of stored bodies in bytes. The least recently
+        used responses are evicted beyond it.
+
+    Expired responses holding an ETag or Last-Modified validator are revalidated
+    with a conditional request instead of being downloaded again.
+
+    Usage::
+
+        from pydwcviz import utils
+        from pydwcviz.cache import ResponseCache
+
+        utils.set_cache(ResponseCache(ttls={"/statistics": 6 * 3600}))
+    """
+
+    def __init__(self, path=default_path, ttl=3600, ttls=None, max_size=256 * 2**20):
+        self.path = path
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored REAL,
+                    accessed REAL,
+                    size INTEGER
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection that commits on success and is always closed."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(url, args):
+        """
+        Build the cache key of a request, dropping None-valued parameters and sorting the rest.
+        """
+        return canonical_key(url, args)
+
+    def ttl_for(self, url):
+        """Return the TTL in seconds that applies to ``url``."""
+        path = urlparse(url).path
+        matches = [prefix for prefix in self.ttls if path.startswith(prefix)]
+        if not matches:
+            return self.ttl
+        return self.ttls[max(matches, key=len)]
+
+    def lookup(self, url, args):
+        """
+        Find a stored response.
+
+        :return: A tuple of (body, fresh, validators) or None when nothing is stored. ``validators``
+            holds the conditional request headers for revalidating a stale body.
+        """
+        key = self.key(url, args)
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT body, etag, last_modified, stored FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            body, etag, last_modified, stored = row
+            fresh = time.time() - stored < self.ttl_for(url)
+            if fresh:
+                self.hits += 1
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            validators = {}
+            if etag:
+                validators["If-None-Match"] = etag
+            if last_modified:
+                validators["If-Modified-Since"] = last_modified
+            if not fresh and not validators:
+                self.misses += 1
+                return None
+            return body, fresh, validators
+
+    def store(self, url, args, body, etag=None, last_modified=None):
+        """Store a response body with its validators and evict down to ``max_size``."""
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url, args), body, etag, last_modified, now, now, len(body)),
+            )
+            self._evict(db)
+
+    def refresh(self, url, args):
+        """Mark a stored response as fresh again after the API answered 304 Not Modified."""
+        now = time.time()
+        with self._lock, self._connect() as db:
+            self.revalidated += 1
+            db.execute(
+                "UPDATE responses SET stored = ?, accessed = ? WHERE key = ?", (now, now, self.key(url, args))
+            )
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def stats(self):
+        """Return the hit, miss and revalidation counters with the number and size of stored responses."""
+        with self._connect() as db:
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "entries": entries,
+            "size": size,
+        }
+
+    def clear(self):
+        """Remove every stored response and reset the counters."""
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM responses")
+            self.hits = self.misses = self.revalidated = 0
@@ -0,0 +1,54 @@
+"""
+Shared fixtures: a local stub of the OBIS API for offline tests
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pydwcviz import utils
+
+def echo(handler):
+    """Default stub route: answer with the request path as JSON and an ETag, honouring If-None-Match"""
+    if handler.headers.get("If-None-Match") == '"v1"':
+        return 304, {}, b""
+    return 200, {"ETag": '"v1"'}, json.dumps({"path": handler.path}).encode()
+
+class Stub:
+    """A local HTTP server whose responses come from ``route(handler) -> (status, headers, body)``"""
+
+    def __init__(self):
+        self.route = echo
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                status, headers, body = stub.route(self)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+@pytest.fixture
+def stub(monkeypatch):
+    """A running local stub server, with get() memoization off so every call reaches the HTTP layer"""
+    monkeypatch.setattr(utils, "memo", utils.Memo(maxsize=0))
+    server = Stub()
+    thread = threading.Thread(target=server.server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+    utils.set_cache(None)
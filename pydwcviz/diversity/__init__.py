@@ -1,6 +1,16 @@
-from .diversity import shannon, es50
+from .diversity import shannon, es50, es, richness
+from .core import CellCounts
+from .cube import cube, Cube
+from .beta import community, beta
 
 __all__ = [
     "shannon",
     "es50",
+    "es",
+    "richness",
+    "CellCounts",
+    "cube",
+    "Cube",
+    "community",
+    "beta",
 ]
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""
+beta: dissimilarity of the species composition of cells, from the sparse cell*species matrix.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from .. import metrics
+from .core import coordinates
+from .diversity import _counts, _keys
+
+# dissimilarities computed by beta(), braycurtis on record counts, the others on presence
+dissimilarities = ["braycurtis", "jaccard", "sorensen"]
+
+# mean Earth radius in km
+earth_radius = 6371.0088
+
+def community(df, decimals=3, cell=None):
+    """
+    Build the cell*species matrix of record counts without a dense pivot table.
+
+    :param df: [DataFrame] Species Occurrence data as a pandas DataFrame, an iterator of
+        DataFrame chunks for data larger than memory, or a :class:`CellCounts` state.
+    :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to aggregate on
+        instead of coordinates rounded to ``decimals``.
+
+    :return: A tuple ``(matrix, cells, species)``: a ``scipy.sparse`` CSR matrix, the DataFrame
+        of cell keys of its rows and the Index of species of its columns
+
+    Usage::
+
+        from pydwcviz import diversity
+        matrix, cells, species = diversity.community(data, decimals=0)
+    """
+    counts = _counts(df, decimals, _keys(cell))
+    return counts.matrix(), counts.cells, counts.species
+
+def _prepare(matrix, metric):
+    """Check the metric and binarize the matrix for the presence based ones."""
+    if metric not in dissimilarities:
+        raise ValueError(f"Unknown metric {metric!r}, use one of {', '.join(dissimilarities)}.")
+    matrix = matrix.tocsr().astype(np.float64)
+    if metric != "braycurtis":
+        matrix.data = (matrix.data > 0).astype(np.float64)
+    matrix.eliminate_zeros()
+    return matrix
+
+def _dissimilarity(shared, left, right, metric):
+    """
+    Dissimilarity from the shared abundance (or species) of two cells and their totals.
+
+    Bray-Curtis is 1 - 2 sum(min) / (Ti + Tj), Sorensen the same on presence and Jaccard 1 - S / (Ri + Rj - S).
+    """
+    if metric == "jaccard":
+        return 1 - shared / (left + right - shared)
+    return 1 - 2 * shared / (left + right)
+
+def _rows(ranges, matrix, columns, metric):
+    """Dissimilarity of every row range ``(start, stop)`` against all the rows, one dense block each."""
+    n = matrix.shape[0]
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    column_nnz = np.diff(columns.indptr)
+    out = []
+    for start, stop in ranges:
+        rows = matrix[start:stop]
+        # join every (row, species) entry of the block with the cells holding that species
+        length = column_nnz[rows.indices]
+        offsets = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+        position = np.repeat(columns.indptr[rows.indices], length) + offsets
+        row = np.repeat(np.repeat(np.arange(stop - start), np.diff(rows.indptr)), length)
+        shared = np.bincount(
+            row * n + columns.indices[position],
+            weights=np.minimum(np.repeat(rows.data, length), columns.data[position]),
+            minlength=(stop - start) * n,
+        ).reshape(stop - start, n)
+        out.append(_dissimilarity(shared, totals[start:stop, None], totals[None, :], metric))
+    return out
+
+def _pairs(ranges, matrix, first, second, metric):
+    """Dissimilarity of the row pairs ``(first[p], second[p])`` of every pair range ``(start, stop)``."""
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    out = []
+    for start, stop in ranges:
+        i, j = first[start:stop], second[start:stop]
+        shared = np.asarray(matrix[i].minimum(matrix[j]).sum(axis=1)).ravel()
+        out.append(_dissimilarity(shared, totals[i], totals[j], metric))
+    return out
+
+def _map(func, ranges, args, n_jobs, executor, out):
+    """
+    Run ``func(ranges, *args)`` in this process, or over shards of the ranges in parallel,
+    and write the block of every range ``(start, stop)`` to ``out[start:stop]``.
+    """
+    if executor is None and n_jobs in (None, 1):
+        shards = [ranges]
+        results = [func(ranges, *args)]
+    else:
+        n_shards = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+        n_shards = max(1, min(n_shards, len(ranges)))
+        shards = [ranges[i::n_shards] for i in range(n_shards)]
+        arguments = [shards] + [repeat(arg) for arg in args]
+        if executor is None:
+            with ProcessPoolExecutor(n_shards) as pool:
+                results = list(pool.map(func, *arguments))
+        else:
+            results = list(executor.map(func, *arguments))
+    for shard, blocks in zip(shards, results):
+        for (start, stop), values in zip(shard, blocks):
+            out[start:stop] = values
+    return out
+
+def _blocks(matrix, columns, block):
+    """Split the rows into ranges whose join and dense output hold at most ``block`` terms."""
+    n = matrix.shape[0]
+    presence = matrix.copy()
+    presence.data = np.ones_like(presence.data)
+    work = presence @ np.diff(columns.indptr).astype(np.float64) + n
+    ranges = []
+    start = 0
+    held = 0.0
+    for row in range(n):
+        if row > start and held + work[row] > block:
+            ranges.append((start, row))
+            start, held = row, 0.0
+        held += work[row]
+    if n:
+        ranges.append((start, n))
+    return ranges
+
+def _index(cells):
+    """Index of the cells, a MultiIndex over several key columns."""
+    if len(cells.columns) > 1:
+        return pd.MultiIndex.from_frame(cells)
+    return pd.Index(cells.iloc[:, 0])
+
+def _positions(cells, grid):
+    """Unit vectors of the cell centres, from coordinate keys or the centroids of grid cell ids."""
+    if grid is not None:
+        lon, lat = grid.centroids(cells.iloc[:, 0].to_numpy())
+    elif all(key in cells.columns for key in coordinates):
+        lon, lat = (cells[key].to_numpy(dtype=float) for key in coordinates)
+    else:
+        raise ValueError("Nearest neighbours of cell ids need the 'grid' they were computed on.")
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def _neighbours(cells, k, grid):
+    """Pairs of every cell with its k nearest cells and their great circle distance in km."""
+    from scipy.spatial import cKDTree
+    positions = _positions(cells, grid)
+    n = len(positions)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    chord, other = cKDTree(positions).query(positions, k=min(k + 1, n))
+    chord, other = chord.reshape(n, -1), other.reshape(n, -1)
+    this = np.repeat(np.arange(n), other.shape[1]).reshape(n, -1)
+    # leave out the cell itself and keep the k nearest others
+    keep = other != this
+    keep &= np.cumsum(keep, axis=1) <= k
+    distance = 2 * np.arcsin(np.clip(chord[keep] / 2, 0, 1)) * earth_radius
+    return this[keep], other[keep], distance
+
+def beta(df, metric="braycurtis", decimals=3, k=None, grid=None, block=2**24, n_jobs=None, executor=None, cell=None):
+    """
+    Compute the dissimilarity of the species composition between cells.
+
+    :param df: [DataFrame] Species Occurrence data as a pandas DataFrame, an iterator of
+        DataFrame chunks for data larger than memory, or a :class:`CellCounts` state.
+    :param metric: [String] One of :data:`dissimilarities`: "braycurtis" on record counts,
+        "jaccard" or "sorensen" on species presence.
+    :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+    :param k: [Integer] Only compare every cell with its k nearest cells. None compares all the pairs.
+    :param grid: [Grid] Grid the ``cell`` ids were computed on, to locate them for ``k``.
+    :param block: [Integer] Maximum number of pair terms held at once.
+    :param n_jobs: [Integer] Number of processes to spread the blocks across. -1 uses all cores.
+    :param executor: [Executor] A ``concurrent.futures`` executor to run the blocks on.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to aggregate on
+        instead of coordinates rounded to ``decimals``.
+
+    :return: A DataFrame. With all pairs, a square DataFrame of dissimilarities indexed by the
+        cells on both axes. With ``k``, one row per cell and neighbour with the keys of the cell,
+        the keys of the neighbour prefixed by ``neighbour_``, their ``distance`` in km and the metric.
+
+    Dissimilarities are computed from the sparse matrix of :func:`community`: for a block of
+    cells, every species they hold is joined with the cells sharing it, so only co-occurring
+    species are ever visited. Blocks are sized to hold at most ``block`` terms, which bounds
+    memory apart from the output itself; the all pairs output grows with the square of the
+    number of cells, use ``k`` for continental grids.
+
+    Usage::
+
+        from pydwcviz import diversity
+        diversity.beta(data, "jaccard", decimals=0)
+
+        # turnover between every cell and its 8 nearest cells, over 8 processes
+        diversity.beta(data, decimals=1, k=8, n_jobs=8)
+
+        # equal-area cells
+        from pydwcviz.grid import EqualAreaGrid
+        grid = EqualAreaGrid(1.0)
+        diversity.beta(grid.assign(data), k=8, grid=grid, cell="cell")
+    """
+    counts = _counts(df, decimals, _keys(cell))
+    matrix = _prepare(counts.matrix(), metric)
+    cells = counts.cells
+
+    if k is None:
+        with metrics.stage("diversity.beta"):
+            columns = matrix.tocsc()
+            out = np.empty((len(cells.index), len(cells.index)))
+            _map(_rows, _blocks(matrix, columns, block), (matrix, columns, metric), n_jobs, executor, out)
+        metrics.count("diversity.beta.pairs", out.size)
+        index = _index(cells)
+        return pd.DataFrame(out, index=index, columns=index.copy(), copy=False)
+
+    with metrics.stage("diversity.beta"):
+        first, second, distance = _neighbours(cells, k, grid)
+        # pairs per range, about block terms given the mean number of species of a cell
+        step = max(1, int(block // max(1.0, 2 * matrix.nnz / max(1, matrix.shape[0]))))
+        ranges = [(i, min(i + step, len(first))) for i in range(0, len(first), step)]
+        values = _map(_pairs, ranges, (matrix, first, second, metric), n_jobs, executor, np.empty(len(first)))
+    metrics.count("diversity.beta.pairs", len(first))
+    out = pd.concat(
+        [
+            cells.iloc[first].reset_index(drop=True),
+            cells.iloc[second].reset_index(drop=True).add_prefix("neighbour_"),
+        ],
+        axis=1,
+    )
+    out["distance"] = distance
+    out[metric] = values
+    return out
@@ -0,0 +1,514 @@
+"""
+core: shared cell*species aggregation used by the diversity indices.
+"""
+import json
+import numpy as np
+import pandas as pd
+from ..schema import aliases, coordinates
+
+# columns identifying a record, the first one present is checked
+identifiers = ["id"] + aliases["id"]
+
+class CellCounts:
+    """
+    Number of records per cell*species pair, stored as integer coded triplets.
+
+    This is also the incremental, mergeable state of the diversity indices: it can be
+    updated with new records, merged with counts built elsewhere and saved to disk,
+    and every index can be computed from it without the raw records.
+
+    :param cells: [DataFrame] One row per cell holding its key columns, sorted by key.
+    :param species: [Index] Species names, indexed by the species codes.
+    :param cell: [ndarray] Cell code of every cell*species pair.
+    :param taxon: [ndarray] Species code of every cell*species pair.
+    :param count: [ndarray] Number of records of every cell*species pair.
+    :param dropped: [Integer] Number of records left out for not being identified to species.
+    :param decimals: [Integer] Precision coordinates were rounded to, used by update().
+
+    Pairs are sorted by cell code, so the rows of ``cells`` line up with
+    ``np.bincount(cell)`` and every index computed from the triplets.
+
+    Usage::
+
+        from pydwcviz import diversity
+
+        state = diversity.CellCounts.from_records(history, decimals=1)
+        state.update(todays_records)
+        state.save("state.npz")
+
+        state = diversity.CellCounts.load("state.npz").merge(other_workers_state)
+        diversity.es50(state)
+    """
+
+    def __init__(self, cells, species, cell, taxon, count, dropped=0, decimals=3):
+        self.cells = cells
+        self.species = species
+        self.cell = cell
+        self.taxon = taxon
+        self.count = count
+        self.dropped = dropped
+        self.decimals = decimals
+
+    @classmethod
+    def empty(cls, decimals=3, keys=coordinates):
+        """
+        Start an empty state to update() with records as they arrive.
+
+        :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+        :param keys: [List <String>] Columns identifying a cell: float64 coordinates or int64 cell ids.
+        """
+        values = [np.zeros(0, dtype=np.float64 if key in coordinates else np.int64) for key in keys]
+        counts = cls._build(values, np.zeros(0, dtype=object), keys)
+        counts.decimals = decimals
+        return counts
+
+    @classmethod
+    def from_records(cls, df, decimals=3, keys=coordinates):
+        """
+        Aggregate occurrence records into cell*species counts.
+
+        :param df: [DataFrame] Species occurrence data with the ``keys`` columns and ``species``.
+        :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+        :param keys: [List <String>] Columns identifying a cell.
+
+        Records without species, without a cell key or without an ``id`` (``gbifID``
+        for GBIF data) are not counted, the same as the groupby counts did.
+        """
+        mask = df["species"].notna().to_numpy()
+        dropped = len(mask) - mask.sum()
+        for key in keys:
+            mask = mask & df[key].notna().to_numpy()
+        # GBIF data identifies its records by gbifID instead of id, see schema.aliases
+        for identifier in identifiers:
+            if identifier in df.columns:
+                mask = mask & df[identifier].notna().to_numpy()
+                break
+
+        values = [_round(df[key].array[mask].to_numpy(), key, decimals) for key in keys]
+        # categorical species are factorized on their codes, never materialized as strings
+        counts = cls._build(values, df["species"].array[mask], keys)
+        counts.dropped = int(dropped)
+        counts.decimals = decimals
+        return counts
+
+    @classmethod
+    def from_chunks(cls, chunks, decimals=3, keys=coordinates):
+        """
+        Fold an iterator of occurrence DataFrames into cell*species counts.
+
+        :param chunks: [Iterable <DataFrame>] Chunks of species occurrence data, e.g. from
+            ``pd.read_csv(..., chunksize=...)`` or Parquet row groups.
+        :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+        :param keys: [List <String>] Columns identifying a cell.
+
+        Only one chunk and the running counts are held at a time, so memory
+        depends on the number of distinct cell*species pairs and the chunk size.
+        """
+        counts = None
+        for chunk in chunks:
+            if counts is None:
+                counts = cls.from_records(chunk, decimals, keys)
+            else:
+                counts.update(chunk)
+        if counts is None:
+            raise ValueError("No occurrence chunks to aggregate.")
+        return counts
+
+    def update(self, df):
+        """
+        Add occurrence records to the counts in place.
+
+        :param df: [DataFrame] New species occurrence records with the same cell key columns.
+
+        :return: This CellCounts
+        """
+        merged = self.merge(self.from_records(df, self.decimals, list(self.cells.columns)))
+        self.__dict__.update(merged.__dict__)
+        return self
+
+    def merge(self, other):
+        """
+        Combine with the counts of another set of records over the same cell keys,
+        e.g. partial states from different workers or datasets.
+
+        :param other: [CellCounts] Counts to add.
+
+        :return: A new CellCounts
+        """
+        keys = list(self.cells.columns)
+        if list(other.cells.columns) != keys or other.decimals != self.decimals:
+            raise ValueError("Only counts over the same cell keys and decimals can be merged.")
+        # states without pairs are left out, so their keys never change the dtype of the others
+        states = [state for state in (self, other) if len(state.count)] or [self]
+        values = [np.concatenate([state.cells[key].to_numpy()[state.cell] for state in states]) for key in keys]
+        species = np.concatenate([state.species.to_numpy()[state.taxon] for state in states])
+        counts = self._build(values, species, keys, np.concatenate([state.count for state in states]))
+        counts.dropped = self.dropped + other.dropped
+        counts.decimals = self.decimals
+        return counts
+
+    def save(self, path):
+        """
+        Write the counts to a compressed ``.npz`` file.
+
+        :param path: [String] Path of the file.
+        """
+        arrays = {f"cells/{key}": _storable(self.cells[key].to_numpy()) for key in self.cells.columns}
+        meta = {"keys": list(self.cells.columns), "dropped": self.dropped, "decimals": self.decimals}
+        np.savez_compressed(
+            path,
+            species=_storable(self.species.to_numpy()),
+            cell=self.cell,
+            taxon=self.taxon,
+            count=self.count,
+            meta=np.array(json.dumps(meta)),
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read counts written by save().
+
+        :param path: [String] Path of the file.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            cells = pd.DataFrame({key: data[f"cells/{key}"] for key in meta["keys"]})
+            return cls(
+                cells,
+                pd.Index(data["species"]),
+                data["cell"],
+                data["taxon"],
+                data["count"],
+                meta["dropped"],
+                meta["decimals"],
+            )
+
+    @classmethod
+    def _build(cls, values, species, keys, weights=None):
+        """
+        Factorize cell keys and species once and count every cell*species pair.
+        """
+        # mixed radix code over all key columns, compacted after each column so
+        # it never overflows and keeps the lexicographic order of the keys
+        code = np.zeros(len(species), dtype=np.int64)
+        for value in values:
+            codes, uniques = pd.factorize(value, sort=True)
+            code = code * len(uniques) + codes
+            _, code = np.unique(code, return_inverse=True)
+        _, first, code = np.unique(code, return_index=True, return_inverse=True)
+        cells = pd.DataFrame({key: value[first] for key, value in zip(keys, values)})
+
+        taxon, names = pd.factorize(species)
+        if isinstance(names, pd.Categorical):
+            names = names.astype(object)
+        if len(names) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(cells, pd.Index(names), empty, empty, empty)
+        pair, pair_index = np.unique(code * len(names) + taxon, return_inverse=True)
+        if weights is None:
+            count = np.bincount(pair_index)
+        else:
+            count = np.bincount(pair_index, weights=weights).astype(np.int64)
+
+        return cls(
+            cells,
+            pd.Index(names),
+            pair // len(names),
+            pair % len(names),
+            count,
+        )
+
+    @property
+    def n_cells(self):
+        """Number of cells."""
+        return len(self.cells.index)
+
+    @property
+    def totals(self):
+        """Number of records per cell."""
+        return np.bincount(self.cell, weights=self.count, minlength=self.n_cells)
+
+    def matrix(self):
+        """
+        Return the counts as a ``scipy.sparse`` CSR matrix of shape (cells, species), rows
+        in the order of ``cells`` and columns in the order of ``species``.
+
+        Pairs are already sorted by cell and species, so the triplets are the CSR arrays
+        as they are and no dense cell*species table is ever built.
+        """
+        from scipy import sparse
+        indptr = np.r_[0, np.cumsum(np.bincount(self.cell, minlength=self.n_cells))]
+        return sparse.csr_matrix((self.count, self.taxon, indptr), shape=(self.n_cells, len(self.species)))
+
+    def frame(self, **columns):
+        """
+        Return the cell keys as a DataFrame with one column per index value.
+        """
+        out = self.cells.copy()
+        for name, value in columns.items():
+            out[name] = value
+        return out
+
+def _storable(value):
+    """Turn object arrays (strings) into fixed width unicode so they are saved without pickle."""
+    return value.astype(str) if value.dtype == object else value
+
+def _decimal(value):
+    """
+    Widen float32 values to the float64 of their shortest decimal form, e.g. 12.3499994 to 12.35,
+    so they land in the same cell as the float64 values they were cast from.
+    """
+    wide = value.astype(np.float64)
+    magnitude = np.floor(np.log10(np.abs(wide), where=wide != 0, out=np.zeros_like(wide)))
+    out = wide.copy()
+    pending = np.isfinite(wide)
+    # the fewest significant digits that still read back as the same float32, 9 always do
+    for digits in range(6, 10):
+        scale = 10.0 ** (digits - 1 - magnitude[pending])
+        candidate = np.round(wide[pending] * scale) / scale
+        exact = candidate.astype(np.float32) == value[pending]
+        index = np.flatnonzero(pending)[exact]
+        out[index] = candidate[exact]
+        pending[index] = False
+        if not pending.any():
+            break
+    return out
+
+def _round(value, key, decimals):
+    """Bin coordinate columns to the requested precision, leave other keys untouched."""
+    if key in coordinates and decimals is not None:
+        if value.dtype == np.float32:
+            value = _decimal(value)
+        # adding 0.0 turns -0.0 into 0.0 so both hash to the same cell
+        return np.round(value.astype(float, copy=False), decimals) + 0.0
+    return value
+
+def shannon_index(counts):
+    """
+    Sum of ``p * log(p)`` over the species of every cell.
+
+    :param counts: [CellCounts] Aggregated cell*species counts.
+
+    :return: An ndarray with one value per cell.
+    """
+    p = counts.count / counts.totals[counts.cell]
+    return np.bincount(counts.cell, weights=p * np.log(p), minlength=counts.n_cells)
+
+def richness_index(counts):
+    """
+    Number of species in every cell.
+
+    :param counts: [CellCounts] Aggregated cell*species counts.
+
+    :return: An ndarray with one value per cell.
+    """
+    return np.bincount(counts.cell, minlength=counts.n_cells)
+
+def log_factorial(upto):
+    """
+    Table of ``log(k!)`` for k = 0..upto, shared by all cells and sample sizes.
+
+    :param upto: [Integer] Largest k needed.
+    """
+    from scipy.special import gammaln
+    return gammaln(np.arange(upto + 1) + 1.0)
+
+def rarefied_index(counts, n, block=2**22):
+    """
+    Hurlbert's expected number of species E(S_n) for several sample sizes in one pass.
+
+    :param counts: [CellCounts] Aggregated cell*species counts.
+    :param n: [List <Integer>] Sample sizes.
+    :param block: [Integer] Maximum number of pair*sample size terms held at once.
+
+    :return: An ndarray of shape (cells, len(n)), NaN where a cell holds fewer than n records.
+
+    A species whose absence from a sample of n is impossible (N - Ni < n) contributes 1.
+    """
+    n = np.asarray(n, dtype=np.int64)
+    out = np.full((counts.n_cells, len(n)), np.nan)
+    if not len(counts.count):
+        return out
+
+    totals = counts.totals.astype(np.int64)
+    total = totals[counts.cell]
+    rest = total - counts.count
+    top = int(totals.max())
+    if top <= 2**24:
+        lf = log_factorial(top).__getitem__
+    else:
+        # a table for cells this large would take gigabytes, evaluate log(k!) directly
+        from scipy.special import gammaln
+        lf = lambda k: gammaln(k + 1.0)
+    # pairs are sorted by cell, so per-cell sums are reduceat over the first pair of every cell
+    starts = np.flatnonzero(np.r_[True, np.diff(counts.cell) != 0])
+    cells = counts.cell[starts]
+
+    step = max(1, block // len(rest))
+    for i in range(0, len(n), step):
+        size = n[None, i:i + step]
+        absent = rest[:, None] >= size
+        log_p = np.where(
+            absent,
+            lf(np.where(absent, rest[:, None], 0))
+            + lf(np.clip(total[:, None] - size, 0, None))
+            - lf(np.where(absent, rest[:, None] - size, 0))
+            - lf(total[:, None]),
+            -np.inf,
+        )
+        out[cells, i:i + step] = np.add.reduceat(1 - np.exp(log_p), starts, axis=0)
+
+    out[totals[:, None] < n[None, :]] = np.nan
+    return out
+
+def es_index(counts, n=50):
+    """
+    Hurlbert's expected number of species in a random sample of ``n`` records.
+
+    :param counts: [CellCounts] Aggregated cell*species counts.
+    :param n: [Integer] Sample size.
+
+    :return: An ndarray with one value per cell.
+
+    Species terms are only evaluated where the cell holds at least ``n`` records
+    besides the species itself; cells with exactly ``n`` records count every
+    species and cells with fewer records sum to 0.
+    """
+    from scipy.special import gammaln
+
+    total = counts.totals[counts.cell]
+    rest = total - counts.count
+
+    term = np.zeros(len(rest))
+    valid = rest >= n
+    term[valid] = 1 - np.exp(
+        gammaln(rest[valid] + 1)
+        + gammaln(total[valid] - n + 1)
+        - gammaln(rest[valid] - n + 1)
+        - gammaln(total[valid] + 1)
+    )
+    term[total == n] = 1
+    return np.bincount(counts.cell, weights=term, minlength=counts.n_cells)
+
+def shannon_sample(x, total):
+    """
+    Shannon's index of resampled counts.
+
+    :param x: [ndarray] Counts of shape (replicates, cells, species).
+    :param total: [ndarray] Number of records of every cell, shape (cells,).
+    """
+    p = x / total[None, :, None]
+    return np.where(x > 0, p * np.log(np.where(x > 0, p, 1)), 0).sum(axis=-1)
+
+def es_sample(x, total, n=50):
+    """
+    ES(n) of resampled counts, as computed by :func:`es_index`.
+
+    :param x: [ndarray] Counts of shape (replicates, cells, species).
+    :param total: [ndarray] Number of records of every cell, shape (cells,).
+    :param n: [Integer] Sample size.
+    """
+    from scipy.special import gammaln
+
+    total = np.broadcast_to(total[None, :, None], x.shape)
+    rest = total - x
+    valid = (rest >= n) & (x > 0)
+    term = np.where(
+        valid,
+        1 - np.exp(
+            gammaln(np.where(valid, rest, n) + 1)
+            + gammaln(np.where(valid, total, n) - n + 1)
+            - gammaln(np.where(valid, rest, n) - n + 1)
+            - gammaln(np.where(valid, total, n) + 1)
+        ),
+        0,
+    )
+    term[(total == n) & (x > 0)] = 1
+    return term.sum(axis=-1)
+
+def _fingerprint(cells):
+    """Integer summarizing the cell keys, so shards of cells draw from different random streams."""
+    return int(pd.util.hash_pandas_object(cells, index=False).to_numpy().sum(dtype=np.uint64))
+
+def bootstrap_index(counts, statistic, ci=0.95, replicates=1000, seed=None, block=2**22):
+    """
+    Percentile bootstrap interval of an index, resampling the records of every cell from its
+    observed species frequencies (multinomial), vectorized across cells and replicates.
+
+    :param counts: [CellCounts] Aggregated cell*species counts.
+    :param statistic: [Callable] Index of resampled counts, e.g. :func:`shannon_sample`.
+    :param ci: [Float] Confidence level, e.g. 0.95 for the 2.5 and 97.5 percentiles.
+    :param replicates: [Integer] Number of bootstrap replicates.
+    :param seed: [Integer] Seed of the random generator, None for fresh entropy.
+    :param block: [Integer] Maximum number of replicate*pair terms held at once.
+
+    :return: A tuple of ndarrays (lower, upper) with one value per cell.
+
+    Cells are processed in blocks of similar richness, padded to the richest cell of the
+    block, so memory stays bounded whatever the number of replicates. Every block draws
+    from its own stream spawned from ``seed`` and the cell keys, so a seed reproduces the
+    same intervals for the same cells and shards.
+    """
+    lower = np.full(counts.n_cells, np.nan)
+    upper = np.full(counts.n_cells, np.nan)
+    if not counts.n_cells:
+        return lower, upper
+
+    totals = counts.totals.astype(np.int64)
+    p = counts.count / totals[counts.cell]
+    richness = np.bincount(counts.cell, minlength=counts.n_cells)
+    starts = np.r_[0, np.cumsum(richness)[:-1]]
+    # resampling a single species always gives back the observed counts
+    single = np.flatnonzero(richness == 1)
+    lower[single] = upper[single] = statistic(totals[single][None, :, None], totals[single])[0]
+    order = np.argsort(richness, kind="stable")[len(single):]
+
+    # consecutive cells of increasing richness, padded to the richness of their last cell
+    blocks = []
+    first = 0
+    for i in range(1, len(order) + 1):
+        if i == len(order) or (i + 1 - first) * richness[order[i]] * replicates > block:
+            blocks.append(order[first:i])
+            first = i
+
+    entropy = None if seed is None else [seed, _fingerprint(counts.cells)]
+    streams = np.random.SeedSequence(entropy).spawn(len(blocks))
+    quantiles = [(1 - ci) / 2, (1 + ci) / 2]
+    for cells, stream in zip(blocks, streams):
+        rng = np.random.default_rng(stream)
+        width = richness[cells[-1]]
+        # species are right aligned: the last column takes the remaining probability
+        column = np.arange(width)[None, :] - (width - richness[cells])[:, None]
+        pvals = np.where(column >= 0, p[starts[cells][:, None] + np.clip(column, 0, None)], 0)
+        total = totals[cells]
+        step = max(1, block // (len(cells) * width))
+        values = np.concatenate([
+            statistic(rng.multinomial(np.broadcast_to(total, (min(step, replicates - r), len(cells))), pvals), total)
+            for r in range(0, replicates, step)
+        ])
+        lower[cells], upper[cells] = np.quantile(values, quantiles, axis=0)
+    return lower, upper
+
+def shard_records(df, decimals=3, n_shards=2, keys=coordinates):
+    """
+    Split occurrence records into shards that never share a cell.
+
+    :param df: [DataFrame] Species occurrence data.
+    :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+    :param n_shards: [Integer] Number of shards.
+    :param keys: [List <String>] Columns identifying a cell.
+
+    :return: A list of DataFrames holding only the columns needed for counting
+
+    Records are assigned by hashing their binned cell key, so every cell lands
+    in exactly one shard and per-shard indices can simply be concatenated.
+    """
+    columns = keys + ["species"] + [c for c in identifiers if c in df.columns]
+    binned = pd.DataFrame({
+        key: _round(df[key].to_numpy(), key, decimals) if key in coordinates else df[key].array
+        for key in keys
+    })
+    shard = pd.util.hash_pandas_object(binned, index=False).to_numpy() % np.uint64(n_shards)
+    return [df.loc[shard == i, columns] for i in range(n_shards)]
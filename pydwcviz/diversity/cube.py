@@ -0,0 +1,139 @@
+"""
+cube: diversity indices over cell * time period * depth band in one grouped pass.
+"""
+from functools import partial
+import numpy as np
+import pandas as pd
+from ..schema import record_years
+from .core import shannon_index, rarefied_index, richness_index, identifiers
+from .diversity import _keys, _run
+
+def _dimensions(df, keys, period, depth):
+    """Return the records with period and depth band key columns added."""
+    columns = {}
+    if period is not None:
+        if not any(column in df.columns for column in ["date_year", "year", "eventDate"]):
+            raise ValueError("A date_year, year or eventDate column is required to group by period.")
+        columns["period"] = np.floor(record_years(df) / period) * period
+    if depth is not None:
+        edges = np.asarray(depth, dtype=float)
+        values = pd.to_numeric(df["depth"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        band = np.searchsorted(edges, values, side="right") - 1
+        # records outside the bands or without depth get NaN and are left out
+        inside = (band >= 0) & (band < len(edges) - 1)
+        columns["depth_band"] = np.where(inside, edges[np.clip(band, 0, len(edges) - 1)], np.nan)
+    needed = [c for c in keys + ["species"] + identifiers if c in df.columns]
+    return df[needed].assign(**columns)
+
+def _cube(counts, n):
+    """Every index of aggregated counts, one row per occupied cell of the cube."""
+    values = rarefied_index(counts, n)
+    return counts.frame(
+        records=counts.totals.astype(np.int64),
+        shannon=shannon_index(counts),
+        richness=richness_index(counts),
+        **{f"es_{size}": values[:, i] for i, size in enumerate(n)},
+    )
+
+class Cube:
+    """
+    Diversity indices over a multi-dimensional key, as returned by :func:`cube`.
+
+    :param frame: [DataFrame] One row per occupied cell of the cube, with the ``dims`` columns
+        followed by the index columns.
+    :param dims: [List <String>] Key columns, e.g. decimalLongitude, decimalLatitude, period, depth_band.
+
+    ``frame`` is the sparse form, only holding occupied cells. ``coords`` lists the sorted
+    values along every dimension and :meth:`array` builds the dense form of one index.
+    """
+
+    def __init__(self, frame, dims):
+        self.frame = frame
+        self.dims = list(dims)
+        self.coords = {dim: np.unique(frame[dim].to_numpy()) for dim in self.dims}
+        self._codes = None
+
+    @property
+    def indices(self):
+        """Names of the index columns."""
+        return [column for column in self.frame.columns if column not in self.dims]
+
+    def sel(self, **values):
+        """
+        Rows of the sparse frame at given coordinates, e.g. ``cube.sel(period=1990, depth_band=0)``.
+
+        :param values: Coordinate, or list of coordinates, per dimension.
+        """
+        mask = np.ones(len(self.frame.index), dtype=bool)
+        for dim, value in values.items():
+            mask &= self.frame[dim].isin(np.atleast_1d(value)).to_numpy()
+        return self.frame[mask]
+
+    def array(self, index):
+        """
+        Dense N-D array of an index, of shape ``[len(coords[dim]) for dim in dims]``, NaN in empty cells.
+
+        :param index: [String] One of :attr:`indices`.
+        """
+        if self._codes is None:
+            self._codes = tuple(np.searchsorted(self.coords[dim], self.frame[dim].to_numpy()) for dim in self.dims)
+        out = np.full(tuple(len(self.coords[dim]) for dim in self.dims), np.nan)
+        out[self._codes] = self.frame[index].to_numpy(dtype=float)
+        return out
+
+    def to_xarray(self):
+        """
+        Return the cube as an ``xarray.Dataset`` with one dense variable per index. Requires xarray.
+        """
+        import xarray as xr
+        return xr.Dataset(
+            {index: (self.dims, self.array(index)) for index in self.indices},
+            coords=self.coords,
+        )
+
+def cube(df, decimals=1, period=10, depth=None, n=(50,), n_jobs=None, executor=None, cell=None):
+    """
+    Compute Shannon's index, richness and ES(n) for every cell, time period and depth band at once.
+
+    :param df: [DataFrame] Species Occurrence data as a pandas DataFrame, or an iterator of
+        DataFrame chunks for data larger than memory.
+    :param decimals: [Integer] Decimals. Precision to be maintained in coordinates.
+    :param period: [Integer] Length of the time periods in years, e.g. 10 for decades, from
+        date_year, year or eventDate. None does not split by time.
+    :param depth: [List <Float>] Edges of the depth bands in meters, e.g. ``[0, 50, 200, 1000, 11000]``.
+        None does not split by depth.
+    :param n: [List <Integer>] Sample sizes of ES(n), see :func:`es`.
+    :param n_jobs: [Integer] Number of processes to shard cells across. -1 uses all cores.
+    :param executor: [Executor] A ``concurrent.futures`` executor to run the shards on.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to use instead
+        of coordinates rounded to ``decimals``.
+
+    :return: A :class:`Cube`
+
+    Records are counted once per cell, period, depth band and species, and every index is
+    computed from those counts, instead of rescanning the records for each subset. Periods are
+    labelled with their first year and depth bands with their shallow edge, included in the band.
+    Records without a year (or depth, when splitting by depth) are left out.
+    ``shannon`` holds the same values as :func:`shannon`, ``es_<n>`` the values of :func:`es`.
+
+    Usage::
+
+        from pydwcviz import diversity
+        cube = diversity.cube(data, decimals=0, period=10, depth=[0, 200, 1000, 11000])
+
+        # ES50 per decade and depth band of one cell
+        cube.sel(decimalLongitude=5.0, decimalLatitude=52.0)
+
+        # dense array, or an xarray Dataset for labelled slicing
+        cube.array("es_50")[..., 0]
+        cube.to_xarray().es_50.sel(period=1990)
+    """
+    keys = _keys(cell) + (["period"] if period is not None else []) + (["depth_band"] if depth is not None else [])
+    spatial = _keys(cell)
+    if isinstance(df, pd.DataFrame):
+        records = _dimensions(df, spatial, period, depth)
+    else:
+        records = (_dimensions(chunk, spatial, period, depth) for chunk in df)
+    n = tuple(int(size) for size in n)
+    out = _run(records, decimals, partial(_cube, n=n), n_jobs, executor, keys)[0]
+    return Cube(out, keys)
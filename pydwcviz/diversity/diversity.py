@@ -1,21 +1,127 @@
 """
 diversity: generate biodiversity indices for species analysis.
 """
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
 import pandas as pd
-import numpy as np
-from scipy.special import loggamma
-import math
+from .. import metrics
+from .core import (
+    CellCounts, shannon_index, es_index, rarefied_index, richness_index, shard_records, coordinates,
+    bootstrap_index, shannon_sample, es_sample,
+)
 
-def shannon(df, decimals=3):
+logger = logging.getLogger(__name__)
+
+def _keys(cell):
+    """Cell key columns: a precomputed cell id column, or the binned coordinates."""
+    return coordinates if cell is None else [cell]
+
+def _counts(df, decimals, keys=coordinates):
+    """Aggregate a DataFrame, or an iterator of DataFrame chunks, into cell*species counts."""
+    if isinstance(df, CellCounts):
+        return df
+    if isinstance(df, pd.DataFrame):
+        return CellCounts.from_records(df, decimals, keys)
+    return CellCounts.from_chunks(df, decimals, keys)
+
+def _apply(df, decimals, index, keys=coordinates):
+    """Count records and compute an index, returning it with the number of dropped records and pairs."""
+    with metrics.stage("diversity.count"):
+        counts = _counts(df, decimals, keys)
+    with metrics.stage("diversity.index"):
+        return index(counts), counts.dropped, len(counts.count)
+
+def _run(df, decimals, index, n_jobs=None, executor=None, keys=coordinates):
+    """
+    Compute an index in this process or, with ``n_jobs``/``executor``, over shards of cells in parallel.
+    """
+    if executor is None and n_jobs in (None, 1):
+        out, dropped, pairs = _apply(df, decimals, index, keys)
+    else:
+        out, dropped, pairs = _run_sharded(df, decimals, index, n_jobs, executor, keys)
+    metrics.count("diversity.dropped", dropped)
+    metrics.count("diversity.pairs", pairs)
+    metrics.count("diversity.cells", len(out.index))
+    logger.info("%d Not species records dropped.", dropped)
+    logger.info("%d unique species*locations records found.", pairs)
+    return out, dropped, pairs
+
+def _run_sharded(df, decimals, index, n_jobs=None, executor=None, keys=coordinates):
+    """Shard the records by cell, compute the index of every shard and concatenate them."""
+    if not isinstance(df, pd.DataFrame):
+        raise ValueError("Parallel computation with 'n_jobs' or 'executor' requires a DataFrame.")
+
+    n_shards = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    shards = shard_records(df, decimals, n_shards, keys)
+    with metrics.stage("diversity.parallel"):
+        if executor is None:
+            with ProcessPoolExecutor(n_shards) as pool:
+                results = list(pool.map(_apply, shards, repeat(decimals), repeat(index), repeat(keys)))
+        else:
+            results = list(executor.map(_apply, shards, repeat(decimals), repeat(index), repeat(keys)))
+
+    out = pd.concat([r[0] for r in results]).sort_values(keys).reset_index(drop=True)
+    return out, sum(r[1] for r in results), sum(r[2] for r in results)
+
+def _interval(name, counts, statistic, ci, replicates, seed):
+    """Bootstrap bound columns of an index, none when ``ci`` is None."""
+    if ci is None:
+        return {}
+    lower, upper = bootstrap_index(counts, statistic, ci, replicates, seed)
+    return {f"{name}_lower": lower, f"{name}_upper": upper}
+
+def _shannon(counts, ci=None, replicates=1000, seed=None):
+    """Shannon's index table of aggregated counts."""
+    return counts.frame(
+        coeff=shannon_index(counts),
+        **_interval("coeff", counts, shannon_sample, ci, replicates, seed),
+    )
+
+def _es50(counts, ci=None, replicates=1000, seed=None):
+    """ES50 table of aggregated counts."""
+    return counts.frame(
+        esi=es_index(counts, 50),
+        **_interval("esi", counts, partial(es_sample, n=50), ci, replicates, seed),
+    )
+
+def _es(counts, n):
+    """ES(n) table of aggregated counts, one column per sample size."""
+    values = rarefied_index(counts, n)
+    return counts.frame(**{f"es_{size}": values[:, i] for i, size in enumerate(n)})
+
+def _richness(counts):
+    """Species richness table of aggregated counts."""
+    return counts.frame(richness=richness_index(counts))
+
+def shannon(df, decimals=3, n_jobs=None, executor=None, cell=None, ci=None, replicates=1000, seed=None):
     """
     Generate Shannon's Diversity Index from species occurrence data.
 
-    :param df: [DataFrame] DataFrame. Species Occurrence data as a pandas DataFrame
+    :param df: [DataFrame] DataFrame. Species Occurrence data as a pandas DataFrame, an
+        iterator of DataFrame chunks for data larger than memory, or a :class:`CellCounts` state.
     :param decimals: [Integer] Decimals. Precision to be maintained in coordinates. 
         Used for aggregation of records (binning).
+    :param n_jobs: [Integer] Number of processes to shard cells across. -1 uses all cores.
+    :param executor: [Executor] A ``concurrent.futures`` executor to run the shards on instead
+        of a new process pool.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to aggregate on
+        instead of coordinates rounded to ``decimals``.
+    :param ci: [Float] Confidence level of bootstrap intervals, e.g. 0.95, adding the
+        ``coeff_lower`` and ``coeff_upper`` columns. None computes the index only.
+    :param replicates: [Integer] Number of bootstrap replicates.
+    :param seed: [Integer] Seed of the bootstrap random generator.
 
     :return: A DataFrame
 
+    The intervals are percentile bootstrap intervals: the records of every cell are
+    resampled from its observed species frequencies, vectorized across cells and
+    replicates in blocks of bounded memory. A seed gives the same intervals for the
+    same data and ``n_jobs``. Cells with few records get wide intervals, but resampling
+    cannot reveal species that were never recorded.
+
     Usage::
 
         from pyobis import occurrences
@@ -27,38 +133,51 @@ def shannon(df, decimals=3):
         ).execute()
         
         diversity.shannon(data, 3)
+
+        # stream a large export in chunks
+        import pandas as pd
+        chunks = pd.read_csv(
+            "occurrence.csv",
+            usecols=["decimalLongitude", "decimalLatitude", "species", "id"],
+            chunksize=1_000_000,
+        )
+        diversity.shannon(chunks, 3)
+
+        # spread the cells over 8 processes
+        diversity.shannon(data, 3, n_jobs=8)
+
+        # aggregate on equal-area cells indexed once
+        from pydwcviz.grid import EqualAreaGrid
+        data = EqualAreaGrid(1.0).assign(data)
+        diversity.shannon(data, cell="cell")
+
+        # 95% bootstrap intervals, reproducible with a seed
+        diversity.shannon(data, 1, ci=0.95, replicates=1000, seed=42)
     """
-    # if the data source is GBIF then convert it to compatible format (column headings)
-    if "id" not in df.columns:
-        df.rename({"gbifID":"id"}, inplace=True)
-    
-    # prepare index only for species and drop unnecessary columns
-    _df = df.dropna(subset=["species"]).round(
-        {"decimalLongitude":decimals, "decimalLatitude":decimals}
-        )[["decimalLongitude","decimalLatitude","species","id"]]
-    print(f"{len(df.index) - len(_df.index)} Not species records dropped.")
-    
-    # aggregate number of records as a proxy for estimating abundance
-    _sh_df = pd.DataFrame(
-        _df.groupby(["decimalLongitude", "decimalLatitude", "species"]).id.count()
-    )
-    print(f"{len(_sh_df.index)} unique species*locations records found.")
-    
-    # preparing the Pi for each species*location pair and calculating individual coefficients
-    _sh_df["sum"] = _df.groupby(["decimalLongitude", "decimalLatitude"]).id.count()
-    _sh_df["coeff"] = _sh_df["id"] / _sh_df["sum"] * (_sh_df["id"] / _sh_df["sum"]).apply(math.log)
-    
-    # sum up coefficients for all species in a location and calculate the total biodiversity
-    return _sh_df.reset_index().groupby(["decimalLongitude", "decimalLatitude"]).coeff.sum().reset_index()
+    # sum up p*log(p) for all species in a location to get the total biodiversity
+    index = _shannon if ci is None else partial(_shannon, ci=ci, replicates=replicates, seed=seed)
+    return _run(df, decimals, index, n_jobs, executor, _keys(cell))[0]
 
-def es50(df, decimals=3):
+def es50(df, decimals=3, n_jobs=None, executor=None, cell=None, ci=None, replicates=1000, seed=None):
     """
     Generate ES50 (Hulbert's) Diversity Index from species occurrence data.
 
-    :param df: [DataFrame] DataFrame. Species Occurrence data as a pandas DataFrame with at least ['decimalLongitude','decimalLatitude', 'id', 'species']
+    :param df: [DataFrame] DataFrame. Species Occurrence data as a pandas DataFrame with at least ['decimalLongitude','decimalLatitude', 'id', 'species'],
+        an iterator of such DataFrame chunks for data larger than memory, or a :class:`CellCounts` state.
     :param decimals: [Integer] Decimals. Precision to be maintained in coordinates. Used for aggregation of records (binning).
+    :param n_jobs: [Integer] Number of processes to shard cells across. -1 uses all cores.
+    :param executor: [Executor] A ``concurrent.futures`` executor to run the shards on instead
+        of a new process pool.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to aggregate on
+        instead of coordinates rounded to ``decimals``.
+    :param ci: [Float] Confidence level of bootstrap intervals, e.g. 0.95, adding the
+        ``esi_lower`` and ``esi_upper`` columns. None computes the index only.
+    :param replicates: [Integer] Number of bootstrap replicates.
+    :param seed: [Integer] Seed of the bootstrap random generator.
 
     :return: A DataFrame
+
+    See :func:`shannon` for the bootstrap intervals.
     
     Usage::
 
@@ -71,23 +190,83 @@ def es50(df, decimals=3):
         ).execute()
         
         diversity.es50(data, 3)
+
+        # stream a large export in chunks
+        import pandas as pd
+        chunks = pd.read_csv(
+            "occurrence.csv",
+            usecols=["decimalLongitude", "decimalLatitude", "species", "id"],
+            chunksize=1_000_000,
+        )
+        diversity.es50(chunks, 3)
+
+        # spread the cells over 8 processes
+        diversity.es50(data, 3, n_jobs=8)
+
+        # aggregate on equal-area cells indexed once
+        from pydwcviz.grid import EqualAreaGrid
+        data = EqualAreaGrid(1.0).assign(data)
+        diversity.es50(data, cell="cell")
+
+        # 95% bootstrap intervals, reproducible with a seed
+        diversity.es50(data, 1, ci=0.95, seed=42)
+    """
+    # sum up the esi of all species in a location to prepare the final table
+    index = _es50 if ci is None else partial(_es50, ci=ci, replicates=replicates, seed=seed)
+    return _run(df, decimals, index, n_jobs, executor, _keys(cell))[0]
+
+def es(df, n=(10, 50, 100), decimals=3, n_jobs=None, executor=None, cell=None):
+    """
+    Generate Hurlbert's expected number of species ES(n) for several sample sizes at once,
+    e.g. ES10/ES50/ES100 or a full rarefaction curve per location.
+
+    :param df: [DataFrame] DataFrame. Species Occurrence data as a pandas DataFrame, an
+        iterator of DataFrame chunks for data larger than memory, or a :class:`CellCounts` state.
+    :param n: [List <Integer>] Sample sizes, one output column ``es_<n>`` each.
+    :param decimals: [Integer] Decimals. Precision to be maintained in coordinates. Used for aggregation of records (binning).
+    :param n_jobs: [Integer] Number of processes to shard cells across. -1 uses all cores.
+    :param executor: [Executor] A ``concurrent.futures`` executor to run the shards on instead
+        of a new process pool.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to aggregate on
+        instead of coordinates rounded to ``decimals``.
+
+    :return: A DataFrame
+
+    All sample sizes are evaluated in one batched pass over the cell*species counts with a
+    shared log-factorial table. Locations with fewer than n records get NaN for ES(n).
+    Unlike es50, which keeps its historical output, a species too abundant to be missing
+    from a sample of n records (N - Ni < n) counts fully, as in Hurlbert (1971).
+
+    Usage::
+
+        from pydwcviz import diversity
+        diversity.es(data, n=[10, 50, 100], decimals=1)
+
+        # rarefaction curves up to 500 records
+        diversity.es(data, n=range(1, 501), decimals=1)
     """
-    # pick only the required columns and drop non-species records
-    df = df.dropna(subset=["species"])[["decimalLongitude","decimalLatitude","species","id"]].round({"decimalLongitude":decimals,"decimalLatitude":decimals})
+    n = tuple(int(size) for size in n)
+    return _run(df, decimals, partial(_es, n=n), n_jobs, executor, _keys(cell))[0]
 
-    # calculate n-ni for all species*locations pair
-    es_df = pd.DataFrame(
-        df.groupby(["decimalLongitude","decimalLatitude"]).id.count() - df.groupby(["decimalLongitude","decimalLatitude","species"]).id.count()
-        ).rename(columns={'id':'n-ni'})
 
-    # calculate the n for each location
-    es_df["n"] = df.groupby(["decimalLongitude","decimalLatitude"]).id.count()
+def richness(df, decimals=3, n_jobs=None, executor=None, cell=None):
+    """
+    Count the number of species recorded in every location.
 
-    # calculate esi when n-ni>=50
-    es_df["esi"] = 1 - np.exp((es_df[es_df["n-ni"]>=50]["n-ni"]+1).apply(loggamma) + (es_df[es_df["n-ni"]>=50]['n']-50+1).apply(loggamma) - (es_df[es_df["n-ni"]>=50]["n-ni"]-50+1).apply(loggamma) - (es_df[es_df["n-ni"]>=50]['n']+1).apply(loggamma))
+    :param df: [DataFrame] DataFrame. Species Occurrence data as a pandas DataFrame, an
+        iterator of DataFrame chunks for data larger than memory, or a :class:`CellCounts` state.
+    :param decimals: [Integer] Decimals. Precision to be maintained in coordinates. Used for aggregation of records (binning).
+    :param n_jobs: [Integer] Number of processes to shard cells across. -1 uses all cores.
+    :param executor: [Executor] A ``concurrent.futures`` executor to run the shards on instead
+        of a new process pool.
+    :param cell: [String] Column of precomputed cell ids (see :mod:`pydwcviz.grid`) to aggregate on
+        instead of coordinates rounded to ``decimals``.
+
+    :return: A DataFrame
 
-    # calculate esi when n = 50
-    es_df.loc[es_df["n"]==50, "esi"] = 1
+    Usage::
 
-    # calculate the sum for esi of all species in all locations to prepare a final table
-    return pd.DataFrame(es_df.reset_index().groupby(["decimalLongitude","decimalLatitude"]).esi.sum()).reset_index()
\ No newline at end of file
+        from pydwcviz import diversity
+        diversity.richness(data, 3)
+    """
+    return _run(df, decimals, _richness, n_jobs, executor, _keys(cell))[0]
@@ -1,7 +1,10 @@
 """
 Tests for diversity module
 """
-from pydwcviz import diversity
+import numpy as np
+import pandas as pd
+from pydwcviz import diversity, synthetic
+from pydwcviz.grid import DegreeGrid, GeohashGrid
 from pyobis import occurrences
 
 def test_shannon_obis():
@@ -22,4 +25,213 @@ def test_es50_obis():
         size = 500,
     ).execute()
 
-    assert diversity.es50(data, 3).__class__.__name__ == "DataFrame"
\ No newline at end of file
+    assert diversity.es50(data, 3).__class__.__name__ == "DataFrame"
+
+def _records():
+    """Small offline occurrence table with a cell of exactly 50 records and a dominant species"""
+    return pd.DataFrame({
+        "decimalLongitude": [0.0001] * 50 + [1.0] * 120 + [2.0] * 30,
+        "decimalLatitude": [0.0] * 200,
+        "species": ["a"] * 20 + ["b"] * 30 + ["a"] * 100 + ["b"] * 15 + ["c"] * 5 + [None] * 30,
+        "id": range(200),
+    })
+
+def test_shannon_counts():
+    """Testing vectorized shannon's index against the per-species groupby definition"""
+    data = _records()
+    out = diversity.shannon(data, 3)
+
+    assert list(out.columns) == ["decimalLongitude", "decimalLatitude", "coeff"]
+    assert list(out.decimalLongitude) == [0.0, 1.0]
+    expected = [0.4 * np.log(0.4) + 0.6 * np.log(0.6), sum(p * np.log(p) for p in [100 / 120, 15 / 120, 5 / 120])]
+    assert np.allclose(out.coeff, expected)
+
+def test_es50_counts():
+    """Testing vectorized ES50 index on cells with exactly and more than 50 records"""
+    out = diversity.es50(_records(), 3)
+
+    assert list(out.columns) == ["decimalLongitude", "decimalLatitude", "esi"]
+    assert np.allclose(out.esi, [2.0, 1.9363406])
+
+def test_es_sample_sizes():
+    """Testing ES(n) for several sample sizes against the closed-form hypergeometric expectation"""
+    from math import comb
+    out = diversity.es(_records(), n=[1, 10, 50, 100], decimals=3)
+
+    assert list(out.columns) == ["decimalLongitude", "decimalLatitude", "es_1", "es_10", "es_50", "es_100"]
+    for row, counts in zip(out.itertuples(), [[20, 30], [100, 15, 5]]):
+        total = sum(counts)
+        for n in [1, 10, 50, 100]:
+            value = getattr(row, f"es_{n}")
+            if total < n:
+                assert np.isnan(value)
+            else:
+                assert np.isclose(value, sum(1 - comb(total - ni, n) / comb(total, n) for ni in counts))
+    pd.testing.assert_frame_equal(diversity.es(_records(), n=[10, 50], n_jobs=2), diversity.es(_records(), n=[10, 50]))
+
+def test_chunked_counts():
+    """Testing that indices from a stream of chunks match the in-memory result"""
+    data = _records().sample(frac=1, random_state=0)
+    chunks = (data.iloc[i:i + 37] for i in range(0, len(data.index), 37))
+
+    pd.testing.assert_frame_equal(diversity.es50(chunks, 3), diversity.es50(data, 3))
+
+    chunks = (data.iloc[i:i + 37] for i in range(0, len(data.index), 37))
+    pd.testing.assert_frame_equal(diversity.shannon(chunks, 3), diversity.shannon(data, 3))
+
+def test_parallel_counts():
+    """Testing that indices sharded over processes match the single process result"""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "decimalLongitude": rng.integers(-5, 5, 5000) * 0.5,
+        "decimalLatitude": rng.integers(-5, 5, 5000) * 0.5,
+        "species": rng.choice(list("abcdefgh"), 5000),
+        "id": range(5000),
+    })
+
+    pd.testing.assert_frame_equal(diversity.shannon(data, 3, n_jobs=3), diversity.shannon(data, 3))
+    pd.testing.assert_frame_equal(diversity.es50(data, 3, n_jobs=2), diversity.es50(data, 3))
+
+def test_cell_column():
+    """Testing indices aggregated on a precomputed grid cell column"""
+    data = DegreeGrid(1).assign(_records())
+    out = diversity.es50(data, cell="cell")
+
+    assert list(out.columns) == ["cell", "esi"]
+    assert np.allclose(out.esi, diversity.es50(_records(), 0).esi)
+    pd.testing.assert_frame_equal(diversity.shannon(data, cell="cell", n_jobs=2), diversity.shannon(data, cell="cell"))
+
+def test_state_update_merge_save(tmp_path):
+    """Testing that an incrementally updated, merged and reloaded state gives the full-history indices"""
+    data = _records().sample(frac=1, random_state=1)
+    first, second, third = data.iloc[:70], data.iloc[70:150], data.iloc[150:]
+
+    state = diversity.CellCounts.empty(decimals=3)
+    state.update(first).update(second)
+    other = diversity.CellCounts.from_records(third, 3)
+    state.merge(other).save(tmp_path / "state.npz")
+    state = diversity.CellCounts.load(tmp_path / "state.npz")
+
+    pd.testing.assert_frame_equal(diversity.es50(state), diversity.es50(data, 3))
+    pd.testing.assert_frame_equal(diversity.shannon(state), diversity.shannon(data, 3))
+    assert list(diversity.richness(state).richness) == [2, 3]
+    assert state.dropped == 30
+
+def test_state_cell_dtype():
+    """Testing that int64 cell ids keep their dtype through an empty state and its updates"""
+    grid = GeohashGrid(12)
+    data = grid.assign(_records())
+    state = diversity.CellCounts.empty(keys=["cell"]).update(data.iloc[:100]).update(data.iloc[100:])
+
+    assert state.cells.cell.dtype == np.int64
+    assert np.array_equal(state.cells.cell, diversity.CellCounts.from_records(data, keys=["cell"]).cells.cell)
+    assert diversity.CellCounts.empty().merge(diversity.CellCounts.from_records(data)).cells.decimalLatitude.dtype == np.float64
+
+def test_cube():
+    """Testing the cell*period*depth cube against indices of the filtered subsets"""
+    data = synthetic.occurrences(20000, seed=8)
+    data["eventDate"] = data["eventDate"].dt.strftime("%Y-%m-%d")
+    data = data.drop(columns="date_year")
+    depth = [0, 20, 100, 11000]
+    cube = diversity.cube(data, decimals=0, period=20, depth=depth, n=[5])
+
+    assert cube.dims == ["decimalLongitude", "decimalLatitude", "period", "depth_band"]
+    assert set(cube.coords["period"]) <= {1940.0, 1960.0, 1980.0, 2000.0, 2020.0}
+    assert set(cube.coords["depth_band"]) <= {0.0, 20.0, 100.0}
+    years = data.eventDate.str[:4].astype(int)
+    subset = data[(years >= 1980) & (years < 2000) & (data.depth >= 20) & (data.depth < 100)]
+    expected = diversity.shannon(subset, 0)
+    got = cube.sel(period=1980, depth_band=20)
+    assert np.allclose(got.shannon, expected.coeff)
+    assert np.allclose(got.es_5, diversity.es(subset, n=[5], decimals=0).es_5, equal_nan=True)
+    assert np.array_equal(got.richness, diversity.richness(subset, 0).richness)
+
+    dense = cube.array("richness")
+    assert dense.shape == tuple(len(cube.coords[dim]) for dim in cube.dims)
+    assert np.nansum(dense) == cube.frame.richness.sum()
+    assert cube.frame.records.sum() == data.species.notna().sum() - (data.depth >= 11000).sum()
+
+    chunks = (data.iloc[i:i + 7000] for i in range(0, len(data.index), 7000))
+    pd.testing.assert_frame_equal(diversity.cube(chunks, decimals=0, period=20, depth=depth, n=[5]).frame, cube.frame)
+
+def test_beta():
+    """Testing sparse beta-diversity against scipy's pdist on the dense pivot table"""
+    from scipy.spatial.distance import pdist, squareform
+    data = synthetic.occurrences(1500, seed=3)
+    matrix, cells, species = diversity.community(data, decimals=0)
+    dense = (
+        data.dropna(subset=["species"])
+        .assign(decimalLongitude=lambda d: d.decimalLongitude.round(0) + 0.0, decimalLatitude=lambda d: d.decimalLatitude.round(0) + 0.0)
+        .pivot_table(index=["decimalLongitude", "decimalLatitude"], columns="species", values="id", aggfunc="count", fill_value=0)
+    )
+    assert matrix.shape == dense.shape
+    assert np.array_equal(matrix.toarray(), dense.reindex(columns=species).to_numpy())
+
+    for metric, name in [("braycurtis", "braycurtis"), ("jaccard", "jaccard"), ("sorensen", "dice")]:
+        expected = squareform(pdist(dense.to_numpy() > 0 if metric != "braycurtis" else dense.to_numpy(), name))
+        out = diversity.beta(data, metric, decimals=0, block=2000)
+        assert out.shape == expected.shape
+        assert np.allclose(out.to_numpy(), expected)
+
+    assert np.allclose(diversity.beta(data, decimals=0, n_jobs=2, block=2000).to_numpy(), squareform(pdist(dense.to_numpy(), "braycurtis")))
+
+    near = diversity.beta(data, "jaccard", decimals=0, k=4, block=100)
+    assert list(near.columns) == [
+        "decimalLongitude", "decimalLatitude", "neighbour_decimalLongitude", "neighbour_decimalLatitude", "distance", "jaccard",
+    ]
+    assert len(near.index) == 4 * len(cells.index)
+    full = diversity.beta(data, "jaccard", decimals=0)
+    rows = full.index.get_indexer(pd.MultiIndex.from_frame(near.iloc[:, :2]))
+    columns = full.columns.get_indexer(pd.MultiIndex.from_frame(near.iloc[:, 2:4]))
+    expected = full.to_numpy()[rows, columns]
+    assert np.allclose(near.jaccard, expected)
+    assert (near.distance > 0).all()
+    lon1, lat1, lon2, lat2 = np.radians(near.iloc[:, :4].to_numpy()).T
+    haversine = 2 * 6371.0088 * np.arcsin(np.sqrt(
+        np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    ))
+    assert np.allclose(near.distance, haversine)
+
+def test_beta_empty():
+    """Testing that data without any cell gives empty frames with the documented columns"""
+    data = _records().assign(species=None)
+    near = diversity.beta(data, "sorensen", k=4)
+    assert list(near.columns) == [
+        "decimalLongitude", "decimalLatitude", "neighbour_decimalLongitude", "neighbour_decimalLatitude", "distance", "sorensen",
+    ]
+    assert len(near.index) == 0
+    assert diversity.beta(data, k=4, n_jobs=2).empty
+    assert diversity.beta(data).shape == (0, 0)
+
+def test_bootstrap_intervals():
+    """Testing bootstrap intervals of shannon's index and ES50 against a per-cell resampling loop"""
+    from pydwcviz.diversity.core import bootstrap_index, shannon_sample, es_sample
+    data = _records()
+    out = diversity.shannon(data, 3, ci=0.9, replicates=2000, seed=1)
+
+    assert list(out.columns) == ["decimalLongitude", "decimalLatitude", "coeff", "coeff_lower", "coeff_upper"]
+    assert (out.coeff_lower <= out.coeff).all() and (out.coeff <= out.coeff_upper).all()
+    pd.testing.assert_frame_equal(out, diversity.shannon(data, 3, ci=0.9, replicates=2000, seed=1))
+    pd.testing.assert_frame_equal(out[["coeff"]], diversity.shannon(data, 3)[["coeff"]])
+
+    # the cell of 120 records with frequencies 100/15/5, resampled one replicate at a time
+    rng = np.random.default_rng(0)
+    samples = rng.multinomial(120, [100 / 120, 15 / 120, 5 / 120], size=2000)
+    expected = np.quantile([shannon_sample(x[None, None, :], np.array([120]))[0, 0] for x in samples], [0.05, 0.95])
+    assert np.allclose(out.loc[1, ["coeff_lower", "coeff_upper"]].to_numpy(dtype=float), expected, atol=0.03)
+
+    esi = diversity.es50(data, 3, ci=0.95, replicates=500, seed=2)
+    assert list(esi.columns) == ["decimalLongitude", "decimalLatitude", "esi", "esi_lower", "esi_upper"]
+    # on the observed counts the resampled statistic is ES50 itself
+    assert np.allclose(es_sample(np.array([[[0, 20, 30], [100, 15, 5]]]), np.array([50, 120]), 50), [esi.esi])
+
+    # blocks of a single cell and few replicates at a time give intervals of the same size
+    counts = diversity.CellCounts.from_records(synthetic.occurrences(3000, seed=5), decimals=0)
+    small = bootstrap_index(counts, shannon_sample, replicates=200, seed=3, block=50)
+    large = bootstrap_index(counts, shannon_sample, replicates=200, seed=3)
+    assert np.all(small[0] <= small[1])
+    assert abs(np.mean(small[1] - small[0]) - np.mean(large[1] - large[0])) < 0.05
+
+    parallel = diversity.es50(data, 3, ci=0.95, replicates=500, seed=2, n_jobs=2)
+    assert list(parallel.columns) == list(esi.columns)
+    pd.testing.assert_series_equal(parallel.esi, esi.esi)
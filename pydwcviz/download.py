@@ -0,0 +1,236 @@
+"""
+download: bulk fetch occurrence records from the OBIS API into a Parquet dataset.
+
+A query is split into independent shards (date ranges, geometry tiles...) that are paged
+through concurrently with ``utils.get``. Every page is written to its own Parquet file and
+progress is kept in a ``_manifest.json`` checkpoint, so an interrupted download resumes
+where it stopped. Parquet support needs pyarrow.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from . import dwca, metrics, utils
+from .dwca import read_parquet
+
+# dtype of the fields of every page, so all the Parquet files of a download share one schema
+# whichever fields a page holds values for: the numeric dtypes of dwca.dtypes and of the
+# numeric OBIS fields, strings for every other field (categoricals included)
+dtypes = {
+    **{term: "string" if kind == "category" else kind for term, kind in dwca.dtypes.items()},
+    "shoredistance": "float64",
+    "bathymetry": "float64",
+    "sst": "float64",
+    "sss": "float64",
+    "date_start": "Int64",
+    "date_mid": "Int64",
+    "date_end": "Int64",
+    "absence": "boolean",
+    "dropped": "boolean",
+}
+
+def date_shards(start, end, periods):
+    """
+    Split a date range into consecutive, non-overlapping ``startdate``/``enddate`` shards.
+
+    :param start: [String] First day, e.g. "1990-01-01".
+    :param end: [String] Last day, included.
+    :param periods: [Integer] Number of shards.
+
+    :return: A list of query parameter dicts
+    """
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    edges = pd.date_range(start, end + pd.Timedelta(days=1), periods=periods + 1).normalize().unique()
+    return [
+        {"startdate": f"{a:%Y-%m-%d}", "enddate": f"{b - pd.Timedelta(days=1):%Y-%m-%d}"}
+        for a, b in zip(edges[:-1], edges[1:])
+    ]
+
+def tile_shards(step=10, bounds=(-180, -90, 180, 90)):
+    """
+    Split an area into square WKT ``geometry`` tiles.
+
+    :param step: [Float] Tile size in degrees.
+    :param bounds: [Tuple <Float>] (west, south, east, north) of the area.
+
+    :return: A list of query parameter dicts
+
+    Records lying exactly on a shared tile edge may be returned for both tiles, :func:`read`
+    drops such duplicates.
+    """
+    west, south, east, north = bounds
+    shards = []
+    y = south
+    while y < north:
+        top = min(y + step, north)
+        x = west
+        while x < east:
+            right = min(x + step, east)
+            shards.append({"geometry": f"POLYGON (({x} {y}, {right} {y}, {right} {top}, {x} {top}, {x} {y}))"})
+            x = right
+        y = top
+    return shards
+
+class Manifest:
+    """
+    Checkpoint of a download: the query, and the cursor and page count of every shard.
+
+    :param path: [String] Path of the ``_manifest.json`` file.
+    :param state: [Dict] Content of the manifest.
+    """
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path, url, params, shards, size):
+        """Load the manifest at ``path``, or start one, checking it describes the same query."""
+        query = {"url": url, "params": params, "size": size, "shards": [shard for shard in shards]}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if {key: state[key] for key in query} != query:
+                raise ValueError(
+                    f"{path} checkpoints a different query, use another directory or delete it to start over."
+                )
+            return cls(path, state)
+        state = {**query, "progress": [{"after": None, "pages": 0, "records": 0, "done": False} for _ in shards]}
+        manifest = cls(path, state)
+        manifest.save()
+        return manifest
+
+    def save(self):
+        # write to a temporary file and rename, so a crash never leaves a truncated manifest
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def advance(self, shard, after, records, done):
+        """Record that one more page of ``shard`` was written."""
+        with self._lock:
+            progress = self.state["progress"][shard]
+            progress["after"] = after
+            progress["pages"] += 1
+            progress["records"] += records
+            progress["done"] = done
+            self.save()
+
+    def progress(self):
+        """
+        Return the progress of every shard as a DataFrame with columns after, pages, records and done.
+        """
+        return pd.DataFrame(self.state["progress"])
+
+def _page_frame(results, columns):
+    df = pd.DataFrame(results)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    # a field missing from the page or null on all its records still gets its dtype
+    for column in df.columns:
+        target = dtypes.get(column, "string")
+        if target in ("string", "boolean"):
+            df[column] = df[column].astype(target)
+        else:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype(target)
+    return df
+
+def _fetch_shard(path, manifest, index, url, params, size, columns, session):
+    progress = manifest.state["progress"][index]
+    if progress["done"]:
+        return
+    after = progress["after"]
+    page = progress["pages"]
+    directory = os.path.join(path, f"shard={index:05d}")
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        args = {**params, **manifest.state["shards"][index], "size": size, "after": after}
+        with metrics.stage("download.page"):
+            # pages are kept in Parquet, storing them in the response cache would only evict other entries
+            out = utils.get(url, args, session=session, memoize=False, cache=False)
+        results = out.get("results", [])
+        done = len(results) < size
+        if results:
+            # an interrupted page is simply written again under the same name
+            _page_frame(results, columns).to_parquet(os.path.join(directory, f"page-{page:06d}.parquet"), index=False)
+            after = results[-1]["id"]
+        metrics.count("download.pages")
+        metrics.count("download.records", len(results))
+        manifest.advance(index, after, len(results), done)
+        page += 1
+        if done:
+            return
+
+def download(path, shards=None, size=5000, workers=4, columns=None, url=None, session=None, **params):
+    """
+    Download the occurrence records matching a query into a Parquet dataset, resuming if interrupted.
+
+    :param path: [String] Directory of the dataset, with one ``shard=...`` directory per shard
+        and a ``_manifest.json`` checkpoint.
+    :param shards: [List <Dict>] Query parameters splitting the query into independent parts,
+        e.g. from :func:`date_shards` or :func:`tile_shards`. None downloads the query as one shard.
+    :param size: [Integer] Records per page, at most 10000.
+    :param workers: [Integer] Number of shards paged through concurrently.
+    :param columns: [List <String>] Fields to keep, e.g. ``dwca.terms["diversity"]``. None keeps every field.
+        Fields are typed by :data:`dtypes`, the others are stored as strings.
+    :param url: [String] URL of the occurrence endpoint, ``{utils.obis_base_url}/occurrence`` by default.
+    :param session: [Session] Session to send the requests with instead of the module-level one.
+    :param params: Query parameters of the occurrence endpoint, e.g. scientificname, taxonid, areaid.
+
+    :return: The progress of every shard, see :meth:`Manifest.progress`
+
+    Pages of a shard follow each other through the ``after`` cursor, the id of the last
+    record received. Calling download() again with the same arguments skips finished
+    shards and continues the others from their last written page; a failed shard does
+    not stop the others, its error is raised once they are done.
+
+    Usage::
+
+        from pydwcviz import download, diversity
+
+        download.download(
+            "mola.parquet",
+            scientificname="Mola mola",
+            shards=download.date_shards("1950-01-01", "2022-12-31", 16),
+            workers=8,
+        )
+        diversity.es50(download.read("mola.parquet"), 1)
+    """
+    url = url or f"{utils.obis_base_url}/occurrence"
+    shards = list(shards) if shards is not None else [{}]
+    os.makedirs(path, exist_ok=True)
+    manifest = Manifest.open(os.path.join(path, "_manifest.json"), url, params, shards, size)
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(_fetch_shard, path, manifest, i, url, params, size, columns, session)
+            for i in range(len(shards))
+        ]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+    return manifest.progress()
+
+def read(path, columns=None, filters=None):
+    """
+    Read a dataset written by :func:`download`, without records repeated across shards.
+
+    :param path: [String] Directory of the dataset.
+    :param columns: [List <String>] Fields to read. None reads every field.
+    :param filters: [List <Tuple>] Row filters pushed down to the files.
+
+    :return: A DataFrame
+    """
+    keep = None if columns is None else list(dict.fromkeys(["id"] + list(columns)))
+    df = read_parquet(path, columns=keep, filters=filters)
+    df = df.drop(columns=["shard"], errors="ignore")
+    if "id" in df.columns:
+        df = df.drop_duplicates("id", ignore_index=True)
+    if columns is not None:
+        df = df[[column for column in columns if column in df.columns]]
+    return df
@@ -0,0 +1,257 @@
+"""
+dwca: stream Darwin Core Archives (DwC-A) into DataFrames and a Parquet cache.
+
+The occurrence file is read in chunks straight from the zip, only the requested
+terms are parsed, and ``to_parquet`` writes one file per chunk so later analyses
+read back only the columns they use. Parquet support needs pyarrow.
+"""
+import csv
+import os
+import zipfile
+from contextlib import contextmanager
+from xml.etree import ElementTree
+
+import pandas as pd
+from . import metrics, schema
+from .schema import ranks
+
+# terms each analysis reads, to pass as ``columns``
+terms = {
+    "diversity": ["id", "gbifID", "decimalLongitude", "decimalLatitude", "species"],
+    "taxon": ranks + ["scientificName", "decimalLatitude"],
+    "map": ["decimalLongitude", "decimalLatitude"],
+}
+
+# compact dtypes of the common occurrence terms: the canonical ones of schema.dtypes and
+# the other common terms, everything else is read as strings
+dtypes = {
+    "coordinateUncertaintyInMeters": "float64",
+    "minimumDepthInMeters": "float64",
+    "maximumDepthInMeters": "float64",
+    "individualCount": "float64",
+    "year": "Int32",
+    "month": "Int8",
+    "day": "Int8",
+    "gbifID": "Int64",
+    "taxonKey": "Int64",
+    "aphiaID": "Int64",
+    "basisOfRecord": "category",
+    "occurrenceStatus": "category",
+    "countryCode": "category",
+    **schema.dtypes,
+}
+
+def _unescape(value):
+    # meta.xml writes control characters as escapes, e.g. fieldsTerminatedBy="\t"
+    return value.encode().decode("unicode_escape") if value else value
+
+def _localname(tag):
+    return tag.rsplit("}", 1)[-1]
+
+class Archive:
+    """
+    A Darwin Core Archive, as a zip file or an unpacked directory, described by its ``meta.xml``.
+
+    :param path: [String] Path of the archive.
+    :param row_type: [String] Row type of the file to read, matched against the end of the
+        rowType URI. The core or extension of occurrences is read by default, falling back to the core.
+
+    ``columns`` lists the terms of the file by their short name, the core id is ``id``.
+
+    Usage::
+
+        from pydwcviz import dwca, diversity
+        archive = dwca.Archive("export.zip")
+
+        # stream only the terms the index needs
+        diversity.es50(archive.chunks(columns=dwca.terms["diversity"]), 1)
+
+        # or cache the archive as Parquet once and read columns back
+        archive.to_parquet("export.parquet")
+        data = dwca.read_parquet("export.parquet", columns=dwca.terms["map"])
+    """
+
+    def __init__(self, path, row_type="Occurrence"):
+        self.path = os.fspath(path)
+        with self._open("meta.xml") as meta:
+            root = ElementTree.parse(meta).getroot()
+
+        files = [node for node in root if _localname(node.tag) in ("core", "extension")]
+        if not files:
+            raise ValueError(f"No core file described in the meta.xml of {self.path}.")
+        matches = [node for node in files if node.get("rowType", "").endswith(row_type)]
+        node = matches[0] if matches else files[0]
+
+        self.row_type = node.get("rowType")
+        self.location = next(
+            child.text.strip() for child in node.iter() if _localname(child.tag) == "location"
+        )
+        self.delimiter = _unescape(node.get("fieldsTerminatedBy", ",")) or ","
+        self.quotechar = _unescape(node.get("fieldsEnclosedBy", '"')) or None
+        self.encoding = node.get("encoding", "UTF-8")
+        self.skiprows = int(node.get("ignoreHeaderLines", "0"))
+
+        # term name -> column index in the file, and constant values of terms without a column
+        self.indices = {}
+        self.defaults = {}
+        for child in node:
+            name = _localname(child.tag)
+            if name in ("id", "coreid"):
+                self.indices["id"] = int(child.get("index"))
+            elif name == "field":
+                term = child.get("term").rstrip("/").rsplit("/", 1)[-1]
+                if child.get("index") is not None:
+                    self.indices.setdefault(term, int(child.get("index")))
+                elif child.get("default") is not None:
+                    self.defaults[term] = child.get("default")
+
+    @property
+    def columns(self):
+        """Short names of the terms available in the file."""
+        return list(self.indices) + [term for term in self.defaults if term not in self.indices]
+
+    @contextmanager
+    def _open(self, name):
+        if os.path.isdir(self.path):
+            with open(os.path.join(self.path, name), "rb") as f:
+                yield f
+        else:
+            with zipfile.ZipFile(self.path) as archive, archive.open(name) as f:
+                yield f
+
+    def chunks(self, columns=None, chunksize=1_000_000, dtype=None):
+        """
+        Stream the file as DataFrame chunks.
+
+        :param columns: [List <String>] Terms to read, e.g. ``dwca.terms["diversity"]``. Terms
+            missing from the archive are skipped. None reads every term.
+        :param chunksize: [Integer] Records per chunk.
+        :param dtype: [Dict] dtypes overriding :data:`dtypes` for some terms.
+
+        Categorical terms carry the categories seen in their chunk only, see :meth:`read`.
+        """
+        names = self.columns if columns is None else [term for term in columns if term in self.columns]
+        read = [term for term in names if term in self.indices]
+        types = {**dtypes, **(dtype or {})}
+        # column index -> terms read from it, e.g. the id and occurrenceID of an occurrence core
+        labels = {}
+        for term in read:
+            labels.setdefault(self.indices[term], []).append(term)
+        usecols = sorted(labels)
+        # a column shared by terms of different dtypes is parsed as strings and cast for each term
+        parse = {}
+        for index, shared in labels.items():
+            kinds = {str(types.get(term, "object")) for term in shared}
+            parse[index] = types.get(shared[0], "object") if len(kinds) == 1 else "object"
+
+        with self._open(self.location) as f:
+            reader = pd.read_csv(
+                f,
+                sep=self.delimiter,
+                quotechar=self.quotechar or '"',
+                quoting=csv.QUOTE_NONE if self.quotechar is None else csv.QUOTE_MINIMAL,
+                encoding=self.encoding,
+                header=None,
+                skiprows=self.skiprows,
+                usecols=usecols,
+                dtype=parse,
+                keep_default_na=False,
+                na_values=[""],
+                chunksize=chunksize,
+            )
+            for chunk in reader:
+                columns = {}
+                for term in names:
+                    if term in self.indices:
+                        index = self.indices[term]
+                        column = chunk[index]
+                        columns[term] = column if parse[index] == types.get(term, "object") else column.astype(types[term])
+                    else:
+                        columns[term] = pd.Series(self.defaults[term], index=chunk.index).astype(types.get(term, "object"))
+                metrics.count("dwca.chunks")
+                metrics.count("dwca.records", len(chunk.index))
+                yield pd.DataFrame(columns, index=chunk.index)
+
+    def read(self, columns=None, chunksize=1_000_000, dtype=None):
+        """
+        Read the whole file into one DataFrame, see :meth:`chunks`.
+
+        Categorical terms are unified over all chunks.
+        """
+        parts = list(self.chunks(columns, chunksize, dtype))
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        categorical = [term for term in parts[0].columns if isinstance(parts[0][term].dtype, pd.CategoricalDtype)]
+        for term in categorical:
+            categories = pd.api.types.union_categoricals([part[term] for part in parts]).categories
+            for part in parts:
+                part[term] = part[term].cat.set_categories(categories)
+        return pd.concat(parts, ignore_index=True)
+
+    def to_parquet(self, path, columns=None, chunksize=1_000_000, dtype=None, partition_cols=None):
+        """
+        Write the file to a directory of Parquet files, one per chunk, without loading it whole.
+
+        :param path: [String] Directory of the Parquet dataset.
+        :param columns: [List <String>] Terms to write. None writes every term.
+        :param chunksize: [Integer] Records per chunk and file.
+        :param dtype: [Dict] dtypes overriding :data:`dtypes` for some terms.
+        :param partition_cols: [List <String>] Terms to partition the dataset by, e.g.
+            ``["year"]``, writing one ``year=...`` directory per value.
+
+        :return: The path of the dataset
+        """
+        os.makedirs(path, exist_ok=True)
+        for i, chunk in enumerate(self.chunks(columns, chunksize, dtype)):
+            if partition_cols:
+                chunk.to_parquet(
+                    path, index=False, partition_cols=partition_cols,
+                    basename_template=f"part-{i:05d}-{{i}}.parquet",
+                )
+            else:
+                chunk.to_parquet(os.path.join(path, f"part-{i:05d}.parquet"), index=False)
+        return path
+
+def read_parquet(path, columns=None, filters=None):
+    """
+    Read columns of a Parquet cache written by :meth:`Archive.to_parquet`, memory-mapping the files.
+
+    :param path: [String] Directory of the Parquet dataset.
+    :param columns: [List <String>] Terms to read, e.g. ``dwca.terms["map"]``. Terms missing
+        from the dataset are skipped. None reads every term.
+    :param filters: [List <Tuple>] Row filters pushed down to the files, e.g. ``[("year", ">=", 2000)]``.
+
+    :return: A DataFrame
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow.fs import LocalFileSystem
+
+    filesystem = LocalFileSystem(use_mmap=True)
+    dataset = ds.dataset(path, format="parquet", partitioning="hive", filesystem=filesystem)
+    # files written from different chunks or pages may miss columns or type them differently
+    schemas = {fragment.physical_schema for fragment in dataset.get_fragments()}
+    if len(schemas) > 1:
+        schema = pa.unify_schemas([dataset.schema, *schemas], promote_options="permissive")
+        dataset = ds.dataset(path, schema=schema, format="parquet", partitioning="hive", filesystem=filesystem)
+    if columns is not None:
+        columns = [term for term in columns if term in dataset.schema.names]
+    table = dataset.to_table(columns=columns, filter=pq.filters_to_expression(filters) if filters else None)
+    return table.to_pandas()
+
+def read(path, columns=None, chunksize=1_000_000, **kwargs):
+    """
+    Read the occurrences of a Darwin Core Archive into a DataFrame.
+
+    :param path: [String] Path of the archive zip or directory.
+    :param columns: [List <String>] Terms to read. None reads every term.
+    :param chunksize: [Integer] Records parsed at a time.
+    :param kwargs: Further arguments to :class:`Archive`.
+
+    Usage::
+
+        from pydwcviz import dwca, taxon
+        taxon.latdist(dwca.read("export.zip", columns=dwca.terms["taxon"]), level="genus")
+    """
+    return Archive(path, **kwargs).read(columns, chunksize)
@@ -0,0 +1,226 @@
+"""
+grid: map coordinates to integer cell ids on reusable spatial grids.
+
+Index a dataset once with ``grid.assign(df)`` and pass the cell column to
+``diversity.shannon``, ``diversity.es50`` or ``map.points`` for every analysis.
+"""
+import abc
+
+import numpy as np
+import pandas as pd
+
+base32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+class Grid(abc.ABC):
+    """
+    Base class of the grids: subclasses turn coordinates into rows and columns of a
+    regular lattice in some projected space, ids are ``row * ncols + col``.
+    """
+    ncols = 1
+    nrows = 1
+
+    @abc.abstractmethod
+    def _rows_cols(self, lon, lat):
+        """Return the row and column arrays of the coordinates."""
+
+    @abc.abstractmethod
+    def _bounds(self, rows, cols):
+        """Return the (west, south, east, north) arrays of the cells at ``rows`` and ``cols``, in degrees."""
+
+    def index(self, lon, lat):
+        """
+        Return the int64 cell id of every coordinate pair, -1 where a coordinate is missing.
+
+        :param lon: [ndarray] Longitudes in degrees.
+        :param lat: [ndarray] Latitudes in degrees.
+        """
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        rows, cols = self._rows_cols(np.where(valid, lon, 0), np.where(valid, lat, 0))
+        rows = np.clip(rows, 0, self.nrows - 1)
+        cols = np.clip(cols, 0, self.ncols - 1)
+        return np.where(valid, rows * self.ncols + cols, -1)
+
+    def assign(self, df, column="cell"):
+        """
+        Return ``df`` with a nullable Int64 column of cell ids computed from decimalLongitude
+        and decimalLatitude, <NA> where a coordinate is missing.
+
+        :param df: [DataFrame] Occurrence records.
+        :param column: [String] Name of the new column.
+        """
+        ids = self.index(df["decimalLongitude"].to_numpy(), df["decimalLatitude"].to_numpy())
+        return df.assign(**{column: pd.arrays.IntegerArray(ids, ids < 0)})
+
+    def bounds(self, ids):
+        """
+        Return the (west, south, east, north) arrays of the cells, in degrees.
+
+        :param ids: [ndarray] Cell ids.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        return self._bounds(ids // self.ncols, ids % self.ncols)
+
+    def centroids(self, ids):
+        """
+        Return the (lon, lat) arrays of the cell centres, in degrees.
+
+        :param ids: [ndarray] Cell ids.
+        """
+        west, south, east, north = self.bounds(ids)
+        return (west + east) / 2, self._mid_lat(south, north)
+
+    def _mid_lat(self, south, north):
+        return (south + north) / 2
+
+    def polygons(self, ids):
+        """
+        Return the cells as an array of shapely polygons in EPSG:4326.
+
+        :param ids: [ndarray] Cell ids.
+        """
+        import shapely
+        return shapely.box(*self.bounds(ids))
+
+class DegreeGrid(Grid):
+    """
+    Regular longitude/latitude grid.
+
+    :param resolution: [Float] Cell size in degrees.
+
+    Usage::
+
+        from pydwcviz.grid import DegreeGrid
+        data = DegreeGrid(0.5).assign(data)
+    """
+
+    def __init__(self, resolution=1.0):
+        self.resolution = resolution
+        self.ncols = int(round(360 / resolution))
+        self.nrows = int(round(180 / resolution))
+
+    def _rows_cols(self, lon, lat):
+        cols = np.floor((lon + 180) / self.resolution).astype(np.int64)
+        rows = np.floor((lat + 90) / self.resolution).astype(np.int64)
+        return rows, cols
+
+    def _bounds(self, rows, cols):
+        west = cols * self.resolution - 180
+        south = rows * self.resolution - 90
+        return west, south, west + self.resolution, south + self.resolution
+
+class GeohashGrid(Grid):
+    """
+    Geohash cells at a precision level; the id is the integer form of the geohash,
+    i.e. its interleaved longitude/latitude bits.
+
+    :param precision: [Integer] Number of geohash characters, 1 to 12.
+
+    Usage::
+
+        from pydwcviz.grid import GeohashGrid
+        grid = GeohashGrid(4)
+        data = grid.assign(data)
+        grid.to_string(data.cell)
+    """
+
+    def __init__(self, precision=5):
+        if not 1 <= precision <= 12:
+            raise ValueError("Argument 'precision' must be between 1 and 12.")
+        self.precision = precision
+        bits = 5 * precision
+        self.lon_bits = (bits + 1) // 2
+        self.lat_bits = bits // 2
+        # rows and cols are the de-interleaved latitude and longitude integers
+        self.ncols = 2 ** self.lon_bits
+        self.nrows = 2 ** self.lat_bits
+
+    def _rows_cols(self, lon, lat):
+        cols = np.floor((lon + 180) / 360 * self.ncols).astype(np.int64)
+        rows = np.floor((lat + 90) / 180 * self.nrows).astype(np.int64)
+        return rows, cols
+
+    def index(self, lon, lat):
+        ids = super().index(lon, lat)
+        valid = ids >= 0
+        return np.where(valid, self._interleave(ids // self.ncols, ids % self.ncols), -1)
+
+    def bounds(self, ids):
+        rows, cols = self._deinterleave(np.asarray(ids, dtype=np.int64))
+        return self._bounds(rows, cols)
+
+    def _bounds(self, rows, cols):
+        width = 360 / self.ncols
+        height = 180 / self.nrows
+        west = cols * width - 180
+        south = rows * height - 90
+        return west, south, west + width, south + height
+
+    def _interleave(self, rows, cols):
+        # geohash bits alternate starting with longitude, most significant first
+        out = np.zeros(len(rows), dtype=np.int64)
+        for bit in range(5 * self.precision):
+            if bit % 2 == 0:
+                value = (cols >> (self.lon_bits - 1 - bit // 2)) & 1
+            else:
+                value = (rows >> (self.lat_bits - 1 - bit // 2)) & 1
+            out = (out << 1) | value
+        return out
+
+    def _deinterleave(self, ids):
+        rows = np.zeros(len(ids), dtype=np.int64)
+        cols = np.zeros(len(ids), dtype=np.int64)
+        total = 5 * self.precision
+        for bit in range(total):
+            value = (ids >> (total - 1 - bit)) & 1
+            if bit % 2 == 0:
+                cols = (cols << 1) | value
+            else:
+                rows = (rows << 1) | value
+        return rows, cols
+
+    def to_string(self, ids):
+        """
+        Return the geohash strings of cell ids.
+
+        :param ids: [ndarray] Cell ids.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        chars = [base32[(ids >> (5 * (self.precision - 1 - i))) & 31] for i in range(self.precision)]
+        return np.array(["".join(c) for c in zip(*chars)])
+
+class EqualAreaGrid(Grid):
+    """
+    Equal-area grid on the Lambert cylindrical equal-area projection: columns are equal
+    steps of longitude and rows equal steps of sin(latitude), so every cell covers the
+    same surface whatever its latitude.
+
+    :param resolution: [Float] Cell width in degrees; cells are square at the equator.
+
+    Usage::
+
+        from pydwcviz.grid import EqualAreaGrid
+        data = EqualAreaGrid(1.0).assign(data)
+    """
+
+    def __init__(self, resolution=1.0):
+        self.resolution = resolution
+        self.ncols = int(round(360 / resolution))
+        self.nrows = int(round(2 / np.radians(resolution)))
+
+    def _rows_cols(self, lon, lat):
+        cols = np.floor((lon + 180) / 360 * self.ncols).astype(np.int64)
+        rows = np.floor((np.sin(np.radians(lat)) + 1) / 2 * self.nrows).astype(np.int64)
+        return rows, cols
+
+    def _bounds(self, rows, cols):
+        width = 360 / self.ncols
+        west = cols * width - 180
+        south = np.degrees(np.arcsin(np.clip(rows * 2 / self.nrows - 1, -1, 1)))
+        north = np.degrees(np.arcsin(np.clip((rows + 1) * 2 / self.nrows - 1, -1, 1)))
+        return west, south, west + width, north
+
+    def _mid_lat(self, south, north):
+        # the latitude splitting the cell into two halves of equal area
+        return np.degrees(np.arcsin((np.sin(np.radians(south)) + np.sin(np.radians(north))) / 2))
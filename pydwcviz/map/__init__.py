@@ -1,5 +1,7 @@
 from .map import points
+from . import basemap
 
 __all__ = [
-    "points"
+    "points",
+    "basemap",
 ]
\ No newline at end of file
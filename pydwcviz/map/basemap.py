@@ -0,0 +1,65 @@
+"""
+basemap: world polygons drawn under the maps, read once and cached per CRS
+
+The Natural Earth 1:110m land polygons (public domain, naturalearthdata.com) ship with
+pydwcviz, so maps draw offline with any geopandas version.
+"""
+import os
+from functools import lru_cache
+from threading import Lock
+
+# Natural Earth 1:110m land polygons bundled with the package
+default_path = os.path.join(os.path.dirname(__file__), "data", "ne_110m_land.geojson")
+
+# local basemap file overriding the bundled one; see set_path()
+path = os.environ.get("PYDWCVIZ_BASEMAP")
+_lock = Lock()
+
+def set_path(basemap_path):
+    """
+    Use a local vector file (shapefile, GeoPackage, GeoJSON...) as the basemap.
+
+    :param basemap_path: [String] Path of the file, or None to fall back to the
+        ``PYDWCVIZ_BASEMAP`` environment variable and the bundled Natural Earth land polygons.
+
+    Usage::
+
+        from pydwcviz.map import basemap
+        basemap.set_path("data/ne_110m_admin_0_countries.shp")
+    """
+    global path
+    path = basemap_path or os.environ.get("PYDWCVIZ_BASEMAP")
+
+def source():
+    """Return the path of the basemap file in use."""
+    return str(path) if path else default_path
+
+@lru_cache(maxsize=4)
+def _read(basemap_path):
+    import geopandas as gpd
+    return gpd.read_file(basemap_path)
+
+@lru_cache(maxsize=32)
+def _project(basemap_path, crs):
+    world = _read(basemap_path)
+    if crs is None or world.crs is None or world.crs == crs:
+        return world
+    return world.to_crs(crs)
+
+def load(crs="epsg:4326"):
+    """
+    Return the basemap polygons in ``crs``. The file is read once and every
+    reprojection is kept, so repeated maps in the same CRS cost nothing.
+    The GeoDataFrame is shared between calls and must not be modified.
+
+    :param crs: [String] CRS of the map.
+
+    :return: A GeoDataFrame
+    """
+    with _lock:
+        return _project(source(), crs)
+
+def clear():
+    """Drop every cached basemap, e.g. after the file changed on disk."""
+    _read.cache_clear()
+    _project.cache_clear()
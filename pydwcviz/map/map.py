@@ -1,17 +1,89 @@
 """
 maps: visualize DwC data easily on maps
+
+matplotlib and geopandas are only imported when a map is drawn.
 """
-import matplotlib.pyplot as plt
-import geopandas as gpd
+import numpy as np
+from .. import metrics
+from . import basemap
+
+# most cells of a density raster; sparser grids only draw their occupied cells
+max_raster = 2**22
+
+def _bins(lon, lat, resolution):
+    """Origin of the grid over the records and the column and row of every record."""
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    lon, lat = lon[valid], lat[valid]
+    if not len(lon):
+        raise ValueError("No records with valid coordinates to map.")
+
+    x0 = np.floor(lon.min() / resolution) * resolution
+    y0 = np.floor(lat.min() / resolution) * resolution
+    nx = int(np.floor((lon.max() - x0) / resolution)) + 1
+    ny = int(np.floor((lat.max() - y0) / resolution)) + 1
+    ix = np.minimum(((lon - x0) // resolution).astype(np.int64), nx - 1)
+    iy = np.minimum(((lat - y0) // resolution).astype(np.int64), ny - 1)
+    return x0, y0, nx, ny, ix, iy
+
+def density(lon, lat, resolution=1.0):
+    """
+    Count records on a regular grid straight from coordinate arrays.
 
-def points(df, crs="epsg:4326", figsize=(20,10)):
+    :param lon: [ndarray] Longitudes (or x coordinates) of the records.
+    :param lat: [ndarray] Latitudes (or y coordinates) of the records.
+    :param resolution: [Float] Size of a grid cell in coordinate units.
+
+    :return: A tuple (x_edges, y_edges, counts) with counts of shape (len(y_edges)-1, len(x_edges)-1)
+
+    The grid spans the bounds of the records; see :func:`occupied` for fine grids over sparse data.
+    """
+    return _raster(_bins(lon, lat, resolution), resolution)
+
+def _raster(bins, resolution):
+    x0, y0, nx, ny, ix, iy = bins
+    counts = np.bincount(iy * nx + ix, minlength=nx * ny).reshape(ny, nx)
+    return x0 + resolution * np.arange(nx + 1), y0 + resolution * np.arange(ny + 1), counts
+
+def occupied(lon, lat, resolution=1.0):
+    """
+    Count records on a regular grid, keeping only the cells holding records.
+
+    :param lon: [ndarray] Longitudes (or x coordinates) of the records.
+    :param lat: [ndarray] Latitudes (or y coordinates) of the records.
+    :param resolution: [Float] Size of a grid cell in coordinate units.
+
+    :return: A tuple (x, y, counts) of the lower left corner and number of records of every occupied
+        cell, so memory depends on the records and never on the extent of the grid
+    """
+    return _cells(_bins(lon, lat, resolution), resolution)
+
+def _cells(bins, resolution):
+    x0, y0, nx, ny, ix, iy = bins
+    cells, counts = np.unique(np.stack([iy, ix]), axis=1, return_counts=True)
+    return x0 + resolution * cells[1], y0 + resolution * cells[0], counts
+
+def points(df, crs="epsg:4326", figsize=(20,10), kind="points", resolution=1.0, cmap="viridis", cell=None, grid=None):
     """
     Generate a point map from DwC data
 
     :param df: [DataFrame] A DwC data DataFrame with at least decimalLongitude, and decimalLatitude
         as column labels
-    :param crs: [String] Define the CRS for the map
+    :param crs: [String] CRS of the decimalLongitude and decimalLatitude coordinates. The map is
+        drawn in it and the basemap is projected to it. Grid ``cell`` ids are in degrees and
+        need a geographic CRS.
     :param figsize: [Tuple] Define the figsize of the plot
+    :param kind: [String] "points" draws every record as a marker. "density" counts records on a
+        grid of ``resolution`` and draws the counts as a raster, which scales to millions of records.
+        Grids of more than :data:`max_raster` cells draw only their occupied cells.
+    :param resolution: [Float] Grid cell size for ``kind="density"``, in units of ``crs``.
+    :param cmap: [String] Colormap for ``kind="density"``.
+    :param cell: [String] Column of precomputed cell ids. Records are counted per cell and
+        drawn as one marker per cell centre, or with ``kind="density"`` as cell polygons.
+    :param grid: [Grid] The :mod:`pydwcviz.grid` grid that produced ``cell``.
+
+    The basemap is read once and cached per CRS, see :mod:`pydwcviz.map.basemap`.
 
     :return: A Matplotlib Axes Object
 
@@ -22,20 +94,80 @@ def points(df, crs="epsg:4326", figsize=(20,10)):
 
         ax = map.points(occurrences.search(scientificname = "Mola mola").execute())
         plt.show()
+
+        # records per 0.5 degree cell, for large datasets
+        ax = map.points(data, kind="density", resolution=0.5)
+
+        # records per equal-area cell, reusing a precomputed cell column
+        from pydwcviz.grid import EqualAreaGrid
+        grid = EqualAreaGrid(1.0)
+        ax = map.points(grid.assign(data), kind="density", cell="cell", grid=grid)
+
+        # draw on another basemap file than the bundled Natural Earth land
+        map.basemap.set_path("ne_110m_admin_0_countries.shp")
     """
-    gdf = gpd.GeoDataFrame(
-        df, 
-        geometry=gpd.points_from_xy(df.decimalLongitude, df.decimalLatitude),
-        crs = crs,
-    )
+    valid = ["points", "density"]
+    if kind not in valid:
+        raise ValueError(f"Argument 'kind' must be one of {valid}.")
+
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    import geopandas as gpd
 
     fig, ax = plt.subplots(figsize=figsize)
+    metrics.count("map.records", len(df.index))
+
+    if cell is not None:
+        if grid is None:
+            raise ValueError("Argument 'grid' is required to decode 'cell' ids.")
+        from pyproj import CRS
+        if not CRS(crs).is_geographic:
+            raise ValueError("Grid 'cell' ids are in degrees, map them with a geographic 'crs'.")
+        with metrics.stage("map.geometry"):
+            ids, counts = np.unique(df[cell].dropna().to_numpy(dtype=np.int64), return_counts=True)
+            # one geometry per occupied cell
+            geometry = grid.polygons(ids) if kind == "density" else gpd.points_from_xy(*grid.centroids(ids))
+            cells = gpd.GeoDataFrame({"records": counts}, geometry=geometry, crs=crs)
+        with metrics.stage("map.draw"):
+            if kind == "density":
+                cells.plot(ax=ax, column="records", cmap=cmap, norm=LogNorm(), legend=True, zorder=10)
+            else:
+                cells.plot(ax=ax, markersize=5, zorder=10)
+    elif kind == "density":
+        # bin the coordinate arrays directly, no per-record geometry is built
+        lon, lat = df["decimalLongitude"].to_numpy(), df["decimalLatitude"].to_numpy()
+        with metrics.stage("map.geometry"):
+            bins = _bins(lon, lat, resolution)
+            sparse = bins[2] * bins[3] > max_raster
+            x, y, counts = _cells(bins, resolution) if sparse else _raster(bins, resolution)
+        with metrics.stage("map.draw"):
+            if sparse:
+                from matplotlib.collections import PolyCollection
+                corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]]) * resolution
+                mesh = PolyCollection(
+                    np.stack([x, y], axis=-1)[:, None, :] + corners,
+                    array=counts, cmap=cmap, norm=LogNorm(), zorder=10,
+                )
+                ax.add_collection(mesh)
+                ax.autoscale()
+            else:
+                mesh = ax.pcolormesh(x, y, np.ma.masked_equal(counts, 0), cmap=cmap, norm=LogNorm(), zorder=10)
+            fig.colorbar(mesh, ax=ax, label="records", shrink=0.6)
+    else:
+        with metrics.stage("map.geometry"):
+            gdf = gpd.GeoDataFrame(
+                df,
+                geometry=gpd.points_from_xy(df.decimalLongitude, df.decimalLatitude),
+                crs = crs,
+            )
+        with metrics.stage("map.draw"):
+            gdf.plot(ax=ax, markersize=5, zorder=10, legend=True)
 
-    gdf.plot(ax=ax, markersize=5, zorder=10, legend=True)
-    world = gpd.read_file(gpd.datasets.get_path('naturalearth_lowres'))
-    world = world.to_crs(gdf.crs)
-    world.plot(ax=ax, color='lightgrey', edgecolor='white', zorder=1)
+    with metrics.stage("map.basemap"):
+        world = basemap.load(crs)
+    with metrics.stage("map.draw"):
+        world.plot(ax=ax, color='lightgrey', edgecolor='white', zorder=1)
 
     ax.set_axis_off()
 
-    return ax
\ No newline at end of file
+    return ax
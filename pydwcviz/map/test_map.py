@@ -0,0 +1,96 @@
+"""
+Tests for map module
+"""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+from pydwcviz import map
+from pydwcviz.map import basemap
+from pydwcviz.map.map import density, occupied
+from pydwcviz.grid import EqualAreaGrid
+
+def test_density():
+    """Test gridded record counts computed straight from coordinate arrays"""
+    lon = np.array([-179.5, -179.2, 10.0, 10.9, np.nan, 179.99])
+    lat = np.array([-89.5, -89.1, 0.5, 0.2, 3.0, 89.99])
+    x, y, counts = density(lon, lat, resolution=1.0)
+
+    assert x[0] == -180 and x[-1] == 180
+    assert y[0] == -90 and y[-1] == 90
+    assert counts.shape == (180, 360)
+    assert counts.sum() == 5
+    assert counts[0, 0] == 2
+    assert counts[90, 190] == 2
+
+def test_occupied():
+    """Test that a fine grid over sparse records only holds the occupied cells"""
+    lon = np.array([-179.5, -179.5, 10.0, np.nan, 179.99])
+    lat = np.array([-89.5, -89.5, 0.5, 3.0, 89.99])
+    x, y, counts = occupied(lon, lat, resolution=0.001)
+
+    assert list(counts) == [2, 1, 1]
+    assert np.allclose(x, [-179.5, 10.0, 179.99], atol=0.001)
+    assert np.allclose(y, [-89.5, 0.5, 89.99], atol=0.001)
+
+def _basemap(tmp_path):
+    """A tiny local basemap file standing in for Natural Earth"""
+    world = gpd.GeoDataFrame(
+        {"name": ["west", "east"]},
+        geometry=[box(-180, -90, 0, 90), box(0, -90, 180, 90)],
+        crs="epsg:4326",
+    )
+    world.to_file(tmp_path / "world.geojson")
+    return tmp_path / "world.geojson"
+
+def test_basemap_cache(tmp_path):
+    """Test that the basemap is read once and reprojections are reused"""
+    basemap.set_path(_basemap(tmp_path))
+    try:
+        assert basemap.load("epsg:4326") is basemap.load("epsg:4326")
+        assert basemap.load("epsg:3857") is basemap.load("epsg:3857")
+        assert basemap.load("epsg:3857").crs == "epsg:3857"
+    finally:
+        basemap.set_path(None)
+        basemap.clear()
+
+def test_default_basemap():
+    """Test that maps draw offline on the bundled Natural Earth land polygons"""
+    basemap.set_path(None)
+    basemap.clear()
+    world = basemap.load("epsg:4326")
+    assert basemap.source() == basemap.default_path
+    assert len(world.index) > 100 and world.is_valid.all()
+    data = pd.DataFrame({"decimalLongitude": [-10.0, 20.5], "decimalLatitude": [5.0, -30.1]})
+    assert map.points(data).__class__.__name__ == "Axes"
+    basemap.clear()
+
+def test_points(tmp_path):
+    """Test point and density maps drawn over a local basemap"""
+    data = pd.DataFrame({"decimalLongitude": [-10.0, 20.5, 20.7], "decimalLatitude": [5.0, -30.1, -30.2]})
+    basemap.set_path(_basemap(tmp_path))
+    try:
+        assert map.points(data).__class__.__name__ == "Axes"
+        assert map.points(data, kind="density", resolution=1).__class__.__name__ == "Axes"
+        # 360000 x 180000 cells at this resolution, only the occupied ones are drawn
+        world = pd.DataFrame({"decimalLongitude": [-179.0, 179.0], "decimalLatitude": [-89.0, 89.0]})
+        ax = map.points(world, kind="density", resolution=0.001)
+        assert len(ax.collections[0].get_paths()) == 2
+    finally:
+        basemap.set_path(None)
+        basemap.clear()
+
+def test_points_cells(tmp_path):
+    """Test maps drawn from a precomputed cell column"""
+    grid = EqualAreaGrid(5)
+    data = grid.assign(pd.DataFrame({"decimalLongitude": [-10.0, 20.5, 20.7], "decimalLatitude": [5.0, -30.1, -30.2]}))
+    basemap.set_path(_basemap(tmp_path))
+    try:
+        assert map.points(data, cell="cell", grid=grid).__class__.__name__ == "Axes"
+        assert map.points(data, kind="density", cell="cell", grid=grid).__class__.__name__ == "Axes"
+        with pytest.raises(ValueError):
+            map.points(data, crs="epsg:3857", cell="cell", grid=grid)
+    finally:
+        basemap.set_path(None)
+        basemap.clear()
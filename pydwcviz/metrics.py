@@ -0,0 +1,169 @@
+"""
+metrics: optional stage timers and counters across pydwcviz operations.
+
+Instrumentation is off by default and then costs one global lookup per stage. Turn it on
+with ``enable()`` or ``collect()`` to aggregate into a :class:`Registry`, and/or register
+callbacks with ``add_callback()`` to forward every measurement, e.g. to a metrics backend.
+
+Stages and counters emitted by pydwcviz:
+
+- ``http.request`` (network time of a request), ``http.requests``, ``http.bytes``,
+  ``json.decode``, ``memo.hit``, ``memo.coalesced``, ``cache.hit``, ``cache.revalidated``, ``cache.miss``
+- ``diversity.count``, ``diversity.index``, ``diversity.parallel``, ``diversity.dropped``,
+  ``diversity.pairs``, ``diversity.cells``, ``diversity.beta``, ``diversity.beta.pairs``
+- ``map.geometry``, ``map.basemap``, ``map.draw``, ``map.records``
+- ``taxon.aggregate``, ``taxon.draw``, ``taxon.records``
+- ``dwca.chunks``, ``dwca.records``, ``download.page``, ``download.pages``, ``download.records``
+
+Work done in other processes (``n_jobs``) is only timed as a whole from the calling process.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# registry receiving measurements, None when aggregation is disabled
+registry = None
+_callbacks = []
+_null = nullcontext()
+
+class Registry:
+    """
+    Thread-safe aggregate of stage timings and counters.
+
+    ``timers`` maps a stage to ``[calls, seconds]`` and ``counters`` a counter to its total.
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, value):
+        """
+        Add a measurement.
+
+        :param kind: [String] "time" for a stage duration in seconds, "count" for a counter increment.
+        :param name: [String] Stage or counter name.
+        :param value: [Float] Seconds or increment.
+        """
+        with self._lock:
+            if kind == "time":
+                timer = self.timers.setdefault(name, [0, 0.0])
+                timer[0] += 1
+                timer[1] += value
+            else:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def frame(self):
+        """
+        Return the measurements as a DataFrame with columns name, kind, calls and value,
+        the total seconds of a stage or the total of a counter.
+        """
+        import pandas as pd
+        with self._lock:
+            rows = [(name, "time", calls, seconds) for name, (calls, seconds) in self.timers.items()]
+            rows += [(name, "count", None, value) for name, value in self.counters.items()]
+        return pd.DataFrame(rows, columns=["name", "kind", "calls", "value"])
+
+    def reset(self):
+        """Drop every measurement."""
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+def enable(new_registry=None):
+    """
+    Start aggregating measurements.
+
+    :param new_registry: [Registry] Registry to aggregate into, a new one by default.
+
+    :return: The active Registry
+    """
+    global registry
+    registry = new_registry if new_registry is not None else Registry()
+    return registry
+
+def disable():
+    """Stop aggregating measurements, callbacks still receive them."""
+    global registry
+    registry = None
+
+@contextmanager
+def collect():
+    """
+    Aggregate the measurements of a block of code into a fresh Registry.
+
+    Usage::
+
+        from pydwcviz import metrics, diversity
+
+        with metrics.collect() as registry:
+            diversity.es50(data, 1)
+        print(registry.frame())
+    """
+    previous = registry
+    try:
+        yield enable()
+    finally:
+        if previous is None:
+            disable()
+        else:
+            enable(previous)
+
+def add_callback(func):
+    """
+    Call ``func(kind, name, value)`` with every measurement, see :meth:`Registry.record`.
+
+    :param func: [Callable] Callback, run in the thread that took the measurement.
+    """
+    _callbacks.append(func)
+
+def remove_callback(func):
+    """Stop calling a callback registered with add_callback()."""
+    _callbacks.remove(func)
+
+def _emit(kind, name, value):
+    if registry is not None:
+        registry.record(kind, name, value)
+    for func in list(_callbacks):
+        func(kind, name, value)
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _emit("time", self.name, time.perf_counter() - self.start)
+        return False
+
+def stage(name):
+    """
+    Time a block of code as stage ``name``.
+
+    :param name: [String] Stage name, e.g. "diversity.count".
+
+    Usage::
+
+        with metrics.stage("report.load"):
+            data = load()
+    """
+    if registry is None and not _callbacks:
+        return _null
+    return _Stage(name)
+
+def count(name, value=1):
+    """
+    Increment counter ``name``.
+
+    :param name: [String] Counter name, e.g. "http.bytes".
+    :param value: [Integer] Increment.
+    """
+    if registry is None and not _callbacks:
+        return
+    _emit("count", name, value)
@@ -0,0 +1,123 @@
+"""
+schema: normalize occurrence frames to the compact canonical columns pydwcviz works on.
+
+OBIS, GBIF and DwC-A exports name the same terms differently (``id``/``gbifID``,
+lower case terms...). ``normalize`` maps them onto one schema and stores taxonomy as
+categoricals, which every pydwcviz function accepts as is.
+"""
+import numpy as np
+import pandas as pd
+
+ranks = ["kingdom", "phylum", "class", "order", "family", "genus", "species"]
+coordinates = ["decimalLongitude", "decimalLatitude"]
+
+# canonical column -> names it goes by in other sources, the first one present is used
+aliases = {
+    "id": ["gbifID", "key", "occurrenceID"],
+    "decimalLongitude": ["longitude", "lon", "lng"],
+    "decimalLatitude": ["latitude", "lat"],
+    "date_year": ["year"],
+}
+
+# canonical column -> compact dtype
+dtypes = {
+    # coordinates stay float64: binning float32 values would move records across cell edges
+    "decimalLongitude": "float64",
+    "decimalLatitude": "float64",
+    "depth": "float32",
+    "date_year": "Int16",
+    "scientificName": "category",
+    **{rank: "category" for rank in ranks},
+}
+
+def canonical(columns):
+    """
+    Return the renames mapping ``columns`` onto the canonical names, e.g. ``{"gbifID": "id"}``.
+
+    :param columns: [List <String>] Column names of a frame.
+
+    Terms are matched case-insensitively, so ``decimallatitude`` becomes ``decimalLatitude``.
+    Aliases only apply when the canonical column is missing.
+    """
+    columns = list(columns)
+    present = set(columns)
+    lower = {}
+    for column in columns:
+        lower.setdefault(column.lower(), column)
+
+    renames = {}
+    for name in list(dtypes) + list(aliases):
+        if name in present or name in renames.values():
+            continue
+        for candidate in [name.lower()] + aliases.get(name, []):
+            column = lower.get(candidate.lower())
+            if column is not None and column not in renames and column not in dtypes:
+                renames[column] = name
+                break
+    return renames
+
+def normalize(df, dtype=None):
+    """
+    Return occurrence records with the canonical columns and compact dtypes.
+
+    :param df: [DataFrame] Occurrence records, e.g. from ``pyobis``, a GBIF download or :mod:`pydwcviz.dwca`.
+    :param dtype: [Dict] dtypes overriding :data:`dtypes`, e.g. ``{"decimalLatitude": "float32"}``
+        to halve the size of coordinates.
+
+    :return: A DataFrame
+
+    Taxonomic ranks and scientificName become categoricals, which usually shrinks
+    species-heavy data several times and speeds up groupbys. Coordinates are kept as
+    float64; float32 coordinates (about 1 m of precision) are still binned on their
+    decimal value by the diversity indices, at some extra cost. Columns already in their
+    target dtype are not copied.
+
+    Canonical columns missing from ``df`` are added from the columns mapped by :func:`canonical`,
+    which are kept as they are, so e.g. ``gbifID`` and ``year`` are still there next to
+    ``id`` and ``date_year``.
+
+    Usage::
+
+        from pydwcviz import schema, diversity, taxon
+        data = schema.normalize(occurrences.search(scientificname="Mola mola").execute())
+        diversity.es50(data, 1)
+        taxon.latdist(data, level="species", top=10)
+    """
+    # canonical columns are added next to the columns they come from, never renamed over them
+    columns = {name: df[column] for column, name in canonical(df.columns).items()}
+    types = {**dtypes, **(dtype or {})}
+    for column, target in types.items():
+        values = columns[column] if column in columns else df.get(column)
+        if values is None or _matches(values.dtype, target):
+            continue
+        if target == "category":
+            columns[column] = values.astype("category")
+        else:
+            columns[column] = pd.to_numeric(values, errors="coerce").astype(target)
+    return df.assign(**columns) if columns else df
+
+def _matches(current, target):
+    if target == "category":
+        return isinstance(current, pd.CategoricalDtype)
+    return current == pd.api.types.pandas_dtype(target)
+
+def record_years(df):
+    """
+    Return the year of every record as a float array, NaN where it is unknown.
+
+    :param df: [DataFrame] Occurrence records.
+
+    The year is read from ``date_year``, then ``year``, then the start of ``eventDate``,
+    the first of these columns present being used.
+    """
+    for column in ["date_year", "year"]:
+        if column in df.columns:
+            return pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if "eventDate" not in df.columns:
+        return np.full(len(df.index), np.nan)
+    dates = df["eventDate"]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.year.to_numpy(dtype=float, na_value=np.nan)
+    # ISO 8601 dates, date-times and ranges all start with the year
+    years = dates.astype("string").str.extract(r"^(\d{4})", expand=False)
+    return pd.to_numeric(years, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
@@ -1,4 +1,7 @@
 from .stats import get_records, get_qc, get_env, get_years, get_composition, dist_years, dist_env
+from .batch import get_many, aget_many
+from .results import YearsResult, EnvResult, CompositionResult
+from . import local
 
 __all__ = [
     "get_records",
@@ -7,5 +10,11 @@ __all__ = [
     "get_years", 
     "get_composition",
     "dist_years",
-    "dist_env"
+    "dist_env",
+    "get_many",
+    "aget_many",
+    "YearsResult",
+    "EnvResult",
+    "CompositionResult",
+    "local",
 ]
\ No newline at end of file
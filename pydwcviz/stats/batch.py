@@ -0,0 +1,85 @@
+"""
+batch: fetch statistics for many taxa or areas concurrently
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from . import stats
+
+endpoints = {
+    "records": stats.get_records,
+    "years": stats.get_years,
+    "env": stats.get_env,
+    "qc": stats.get_qc,
+    "composition": stats.get_composition,
+}
+
+class RateLimiter:
+    """
+    Spaces out request starts to at most ``rate`` per second.
+
+    :param rate: [Float] Maximum number of requests started per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def aget_many(endpoint, params, concurrency=8, rate=10):
+    """
+    Coroutine version of get_many(), for use inside a running event loop such as a notebook.
+
+    Usage::
+
+        from pydwcviz import stats
+        results = await stats.aget_many("years", [{"taxonid": 1071}, {"taxonid": 1363}])
+    """
+    func = endpoints[endpoint] if isinstance(endpoint, str) else endpoint
+    semaphore = asyncio.Semaphore(concurrency)
+    # every statistics endpoint lives on the API host, so one limiter covers the batch
+    limiter = RateLimiter(rate) if rate else None
+    loop = asyncio.get_running_loop()
+
+    async def fetch(executor, kwargs):
+        async with semaphore:
+            if limiter is not None:
+                await limiter.wait()
+            try:
+                return await loop.run_in_executor(executor, partial(func, **kwargs))
+            except Exception as e:
+                return e
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return await asyncio.gather(*(fetch(executor, kwargs) for kwargs in params))
+
+def get_many(endpoint, params, concurrency=8, rate=10):
+    """
+    Fetch one statistics endpoint for many sets of arguments concurrently.
+
+    :param endpoint: [String] One of "records", "years", "env", "qc" or "composition", or
+        one of the ``stats.get_*`` functions.
+    :param params: [List <Dict>] Keyword arguments of every request, e.g. ``[{"taxonid": 1071}, ...]``.
+    :param concurrency: [Integer] Maximum number of requests in flight.
+    :param rate: [Float] Maximum number of requests started per second against the API host.
+        None disables rate limiting.
+
+    :return: A list of results in the order of ``params``. A request that failed holds its
+        exception instead of a result, the rest of the batch still completes.
+
+    Usage::
+
+        from pydwcviz import stats
+        results = stats.get_many("env", [{"taxonid": t} for t in [1071, 1363, 127405]], concurrency=4)
+        failed = [r for r in results if isinstance(r, Exception)]
+    """
+    return asyncio.run(aget_many(endpoint, params, concurrency, rate))
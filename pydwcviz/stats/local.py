@@ -0,0 +1,189 @@
+"""
+local: the /statistics summaries computed from occurrence records held locally
+
+Every function takes a DataFrame, or the path of a Parquet dataset of which only the
+needed columns are read, and returns the JSON shape of the matching ``get_*`` function,
+so ``dist_years`` and ``dist_env`` plot the results as they are.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from ..schema import ranks, record_years
+from .results import YearsResult, EnvResult, CompositionResult
+
+# width of the histogram bins of the environmental parameters
+env_bins = {"sst": 1, "sss": 1, "depth": 10}
+
+# terms counted as missing by qc()
+qc_terms = ["decimalLongitude", "decimalLatitude", "eventDate", "date_year", "depth", "aphiaID", "scientificName"]
+
+def _load(data, columns):
+    """Return ``data`` as a DataFrame, reading only ``columns`` when it is a Parquet dataset path."""
+    if isinstance(data, (str, os.PathLike)):
+        from ..dwca import read_parquet
+        return read_parquet(data, columns=columns + ["dropped", "absence"])
+    return data
+
+def _selected(df, dropped=None, absence=None):
+    """
+    Mask of the records selected by the ``dropped`` and ``absence`` arguments, following the API:
+    None leaves them out, "include" keeps them and "true" keeps only them.
+    """
+    mask = np.ones(len(df.index), dtype=bool)
+    for column, value in [("dropped", dropped), ("absence", absence)]:
+        if column not in df.columns:
+            if value == "true":
+                mask[:] = False
+            continue
+        flagged = df[column].fillna(False).to_numpy(dtype=bool)
+        if value is None:
+            mask &= ~flagged
+        elif value == "true":
+            mask &= flagged
+    return mask
+
+def _rows(key, values, counts):
+    return [{key: value, "records": int(count)} for value, count in zip(values.tolist(), counts.tolist())]
+
+def years(data, dropped=None, absence=None, columnar=False):
+    """
+    Number of presence records per year, as returned by ``get_years``.
+
+    :param data: [DataFrame] Occurrence records with ``date_year``, ``year`` or ``eventDate``, or the path of a Parquet dataset.
+    :param dropped: [string] Include dropped records (include) or get dropped records exclusively (true).
+    :param absence: [string] Include absence records (include) or get absence records exclusively (true).
+    :param columnar: [boolean] Return a :class:`YearsResult` instead of the JSON shape.
+
+    Usage::
+
+        from pydwcviz import stats
+        stats.dist_years(stats.local.years(data))
+    """
+    df = _load(data, ["date_year", "year", "eventDate"])
+    year = record_years(df)
+    year = year[_selected(df, dropped, absence) & np.isfinite(year)].astype(np.int64)
+    if len(year):
+        counts = np.bincount(year - year.min())
+        present = np.flatnonzero(counts)
+        out = _rows("year", present + year.min(), counts[present])
+    else:
+        out = []
+    return YearsResult(out) if columnar else out
+
+def env(data, bins=None, dropped=None, absence=None, columnar=False):
+    """
+    Number of records per SST, SSS and depth bin, as returned by ``get_env``.
+
+    :param data: [DataFrame] Occurrence records with ``sst``, ``sss`` and ``depth``, or the path of a Parquet dataset.
+    :param bins: [Dict] Bin widths overriding :data:`env_bins`, e.g. ``{"depth": 100}``.
+    :param dropped: [string] Include dropped records (include) or get dropped records exclusively (true).
+    :param absence: [string] Include absence records (include) or get absence records exclusively (true).
+    :param columnar: [boolean] Return an :class:`EnvResult` instead of the JSON shape.
+
+    A record counts in the bin starting at its value rounded down to a multiple of the width.
+
+    Usage::
+
+        from pydwcviz import stats
+        stats.dist_env(stats.local.env(data), parameter="sst")
+    """
+    widths = {**env_bins, **(bins or {})}
+    df = _load(data, list(widths))
+    mask = _selected(df, dropped, absence)
+    out = {}
+    for parameter, width in widths.items():
+        if parameter not in df.columns:
+            out[parameter] = []
+            continue
+        values = df[parameter].to_numpy(dtype=float, na_value=np.nan)[mask]
+        edges, counts = np.unique(np.floor(values[np.isfinite(values)] / width), return_counts=True)
+        edges = edges * width
+        if float(width).is_integer():
+            edges = edges.astype(np.int64)
+        out[parameter] = _rows(parameter, edges, counts)
+    return EnvResult(out) if columnar else out
+
+def qc(data, dropped=None, absence=None):
+    """
+    QC summary: number of records, records carrying each quality flag, missing values
+    of the main terms, and dropped and absence records.
+
+    :param data: [DataFrame] Occurrence records, or the path of a Parquet dataset.
+    :param dropped: [string] Include dropped records (include) or get dropped records exclusively (true).
+    :param absence: [string] Include absence records (include) or get absence records exclusively (true).
+
+    :return: A dict ``{"records": n, "flags": {flag: n}, "missing": {term: n}, "dropped": n, "absence": n}``.
+        ``flags`` is read from a list or comma separated ``flags`` column, as in OBIS records.
+    """
+    df = _load(data, ["flags"] + qc_terms)
+    columns = [column for column in ["flags", "dropped", "absence"] + qc_terms if column in df.columns]
+    selected = df.loc[_selected(df, dropped, absence), columns]
+
+    flags = {}
+    if "flags" in selected.columns:
+        column = selected["flags"].dropna()
+        if len(column) and isinstance(column.iloc[0], str):
+            column = column.str.split(",")
+        counts = column.explode().dropna()
+        counts = counts[counts != ""].value_counts()
+        flags = {str(flag): int(count) for flag, count in counts.items()}
+
+    return {
+        "records": int(len(selected.index)),
+        "flags": flags,
+        "missing": {term: int(selected[term].isna().sum()) for term in qc_terms if term in selected.columns},
+        "dropped": int(selected["dropped"].fillna(False).astype(bool).sum()) if "dropped" in selected.columns else 0,
+        "absence": int(selected["absence"].fillna(False).astype(bool).sum()) if "absence" in selected.columns else 0,
+    }
+
+def composition(data, dropped=None, absence=None, columnar=False):
+    """
+    Number of records per taxon at every rank, as returned by ``get_composition``.
+
+    :param data: [DataFrame] Occurrence records with the taxonomy columns, or the path of a Parquet dataset.
+    :param dropped: [string] Include dropped records (include) or get dropped records exclusively (true).
+    :param absence: [string] Include absence records (include) or get absence records exclusively (true).
+    :param columnar: [boolean] Return a :class:`CompositionResult` instead of the JSON shape.
+
+    :return: A dict with one list of ``{rank: name, "records": n}`` rows per rank, most recorded first
+    """
+    df = _load(data, ranks)
+    mask = _selected(df, dropped, absence)
+    out = {}
+    for rank in ranks:
+        if rank not in df.columns:
+            continue
+        codes, taxa = pd.factorize(df[rank].array[mask])
+        counts = np.bincount(codes[codes >= 0], minlength=len(taxa))
+        order = np.argsort(-counts, kind="stable")
+        out[rank] = _rows(rank, np.asarray(taxa, dtype=object)[order], counts[order])
+    return CompositionResult(out) if columnar else out
+
+def summary(data, bins=None, dropped=None, absence=None, columnar=False):
+    """
+    Compute years, env, qc and composition at once, reading a Parquet dataset a single time.
+
+    :param data: [DataFrame] Occurrence records, or the path of a Parquet dataset.
+    :param bins: [Dict] Bin widths of env().
+    :param dropped: [string] Include dropped records (include) or get dropped records exclusively (true).
+    :param absence: [string] Include absence records (include) or get absence records exclusively (true).
+    :param columnar: [boolean] Return result objects for years, env and composition.
+
+    :return: A dict with keys "years", "env", "qc" and "composition"
+
+    Usage::
+
+        from pydwcviz import stats
+        out = stats.local.summary("mola.parquet")
+        stats.dist_env(out["env"], parameter="depth")
+    """
+    columns = ["date_year", "year", "eventDate", "flags"] + list({**env_bins, **(bins or {})}) + qc_terms + ranks
+    df = _load(data, list(dict.fromkeys(columns)))
+    return {
+        "years": years(df, dropped, absence, columnar),
+        "env": env(df, bins, dropped, absence, columnar),
+        "qc": qc(df, dropped, absence),
+        "composition": composition(df, dropped, absence, columnar),
+    }
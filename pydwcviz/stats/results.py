@@ -0,0 +1,92 @@
+"""
+results: compact columnar views of the statistics endpoints
+"""
+import numpy as np
+import pandas as pd
+
+def _columns(rows, key, key_dtype):
+    """Split a list of ``{key: ..., "records": ...}`` rows into typed arrays."""
+    keys = np.fromiter((row[key] for row in rows), dtype=key_dtype, count=len(rows))
+    records = np.fromiter((row["records"] for row in rows), dtype=np.int32, count=len(rows))
+    return keys, records
+
+class YearsResult:
+    """
+    Number of presence records per year, as returned by ``get_years(columnar=True)``.
+
+    :param data: [List <Dict>] JSON payload of the statistics/years endpoint.
+
+    ``year`` and ``records`` are int32 arrays, ``frame`` is a DataFrame built once on first use.
+    """
+
+    def __init__(self, data):
+        self.year, self.records = _columns(data, "year", np.int32)
+        self._frame = None
+
+    def __len__(self):
+        return len(self.year)
+
+    @property
+    def frame(self):
+        """DataFrame with columns ``year`` and ``records``."""
+        if self._frame is None:
+            self._frame = pd.DataFrame({"year": self.year, "records": self.records})
+        return self._frame
+
+class EnvResult:
+    """
+    Number of records per SST, SSS and depth bin, as returned by ``get_env(columnar=True)``.
+
+    :param data: [Dict] JSON payload of the statistics/env endpoint.
+
+    ``bins[parameter]`` are float64 arrays and ``records[parameter]`` int32 arrays.
+    """
+
+    def __init__(self, data):
+        self.bins = {}
+        self.records = {}
+        for parameter, rows in data.items():
+            self.bins[parameter], self.records[parameter] = _columns(rows, parameter, np.float64)
+        self._frames = {}
+
+    def frame(self, parameter):
+        """
+        DataFrame with columns ``parameter`` and ``records``, built once per parameter.
+
+        :param parameter: [String] One of "sst", "sss", or "depth".
+        """
+        if parameter not in self._frames:
+            self._frames[parameter] = pd.DataFrame(
+                {parameter: self.bins[parameter], "records": self.records[parameter]}
+            )
+        return self._frames[parameter]
+
+class CompositionResult:
+    """
+    Taxonomic composition, as returned by ``get_composition(columnar=True)``.
+
+    :param data: [Dict] JSON payload of the statistics/composition endpoint.
+
+    Every list of rows in the payload becomes a DataFrame with int32 ``records``, built once
+    on first use of ``frame(key)``.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._frames = {}
+
+    def keys(self):
+        return [key for key, rows in self.data.items() if isinstance(rows, list)]
+
+    def frame(self, key):
+        """
+        DataFrame of the rows under ``key`` in the payload.
+
+        :param key: [String] Key of the payload, e.g. a taxonomic rank.
+        """
+        if key not in self._frames:
+            df = pd.DataFrame(self.data[key])
+            if "records" in df.columns:
+                df["records"] = df["records"].astype(np.int32)
+            self._frames[key] = df
+        return self._frames[key]
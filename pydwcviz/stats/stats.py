@@ -1,10 +1,12 @@
 """
 stats: visualize distribution of records and environmental parameters
+
+matplotlib and plotly are only imported by the plotting functions, so fetching
+statistics does not pay for loading them.
 """
 import pandas as pd
 from ..utils import get, obis_base_url
-import matplotlib.pyplot as plt
-import plotly.express as px
+from .results import YearsResult, EnvResult, CompositionResult
 
 def get_records(
     scientificname = None,
@@ -94,6 +96,7 @@ def get_years(
     absence=None,
     flags=None,
     exclude=None,
+    columnar=False,
     **kwargs,
     ):
     """
@@ -116,11 +119,15 @@ def get_years(
     :param absence: [string] Include absence records (include) or get absence records exclusively (true).
     :param flags: [string] Comma separated list of quality flags which need to be set.
     :param exclude: [string] Comma separated list of quality flags to be excluded.
+    :param columnar: [boolean] Return a :class:`YearsResult` with typed arrays and a cached DataFrame view instead of the raw JSON.
 
     Usage::
 
         from pydwcviz import stats
         stats.get_years(scientificname="Mola mola")
+
+        # typed arrays with a cached DataFrame view
+        stats.get_years(scientificname="Mola mola", columnar=True).frame
     """
     args = {
         "scientificname":	scientificname,
@@ -142,6 +149,8 @@ def get_years(
         "exclude":	exclude,
     }
     out = get(f'{obis_base_url}/statistics/years',args, **kwargs)
+    if columnar:
+        return YearsResult(out)
     return out
 
 def get_env(
@@ -162,6 +171,7 @@ def get_env(
     absence=None,
     flags=None,
     exclude=None,
+    columnar=False,
     **kwargs,
     ):
     """
@@ -184,12 +194,16 @@ def get_env(
     :param absence: [string] Include absence records (include) or get absence records exclusively (true).
     :param flags: [string] Comma separated list of quality flags which need to be set.
     :param exclude: [string] Comma separated list of quality flags to be excluded.
+    :param columnar: [boolean] Return an :class:`EnvResult` with typed arrays and a cached DataFrame view instead of the raw JSON.
 
     Usage::
 
         from pydwcviz import stats
         stats.get_env(scientificname="Mola mola")
 
+        # typed arrays with a cached DataFrame view per parameter
+        stats.get_env(scientificname="Mola mola", columnar=True).frame("sst")
+
     """
     args = {
         "scientificname":	scientificname,
@@ -211,6 +225,8 @@ def get_env(
         "exclude":	exclude,
     }
     out = get(f'{obis_base_url}/statistics/env',args, **kwargs)
+    if columnar:
+        return EnvResult(out)
     return out
 
 def get_qc(
@@ -301,6 +317,7 @@ def get_composition(
     absence=None,
     flags=None,
     exclude=None,
+    columnar=False,
     **kwargs,
     ):
     """
@@ -323,6 +340,7 @@ def get_composition(
     :param absence: [string] Include absence records (include) or get absence records exclusively (true).
     :param flags: [string] Comma separated list of quality flags which need to be set.
     :param exclude: [string] Comma separated list of quality flags to be excluded.
+    :param columnar: [boolean] Return a :class:`CompositionResult` with cached, typed DataFrame views instead of the raw JSON.
 
     Usage::
 
@@ -350,13 +368,15 @@ def get_composition(
         "exclude":	exclude,
     }
     out = get(f'{obis_base_url}/statistics/composition',args, **kwargs)
+    if columnar:
+        return CompositionResult(out)
     return out
 
 def dist_years(data, interactive=False, **kwargs):
     """
     Get a bar graph of distribution of number of records per year
 
-    :param data: [Dict] Ingest data grabbed from get_years() function.
+    :param data: [Dict] Ingest data grabbed from get_years() function, raw or columnar.
 
     :return: a matplotlib Axes object or plotly Figure object
 
@@ -369,21 +389,23 @@ def dist_years(data, interactive=False, **kwargs):
         # return a plotly object when interactive=True
         stats.dist_years(stats.get_years(taxonid = 1071), interactive=True)
     """
-    df = pd.DataFrame(data)
+    df = data.frame if isinstance(data, YearsResult) else pd.DataFrame(data)
     if not interactive:
+        import matplotlib.pyplot as plt
         ax = plt.bar(x = df['year'], height = df['records'])
         plt.xlabel("year")
         plt.ylabel("records")
         return ax
     
-    fig = px.bar(data, x = "year", y = "records")
+    import plotly.express as px
+    fig = px.bar(df, x = "year", y = "records")
     return fig
 
 def dist_env(data, parameter, interactive=False, **kwargs):
     """
     Get a distribution of environmental parameters: SST, SSS and depth
     
-    :param data: [Dict] Ingest data grabbed from get_env() function.
+    :param data: [Dict] Ingest data grabbed from get_env() function, raw or columnar.
     :param parameter: [String] One of "sst", "sss", or "depth" to visualize its distribution
 
     :return: a matplotlib Axes object or plotly Figure object
@@ -401,18 +423,21 @@ def dist_env(data, parameter, interactive=False, **kwargs):
     if parameter not in valid:
         raise ValueError(f"Argument 'parameter' must be one of {valid}.")
 
-    df = pd.DataFrame(data[parameter])
+    df = data.frame(parameter) if isinstance(data, EnvResult) else pd.DataFrame(data[parameter])
     angle = 0
 
     if parameter == "depth":
-        df[df.columns[0]] = df[df.columns[0]].astype(str)
+        # assign a new frame rather than modify the one cached by EnvResult
+        df = df.assign(**{df.columns[0]: df[df.columns[0]].astype(str)})
         angle = 90
-    if not interactive:        
+    if not interactive:
+        import matplotlib.pyplot as plt
         ax = plt.bar(x = df[df.columns[0]], height = df[df.columns[1]])
         plt.xlabel(parameter)
         plt.ylabel(df.columns[1])
         plt.xticks(rotation = angle)
         return ax
     
+    import plotly.express as px
     fig = px.bar(df, x = df.columns[0], y = df.columns[1], labels={df.columns[0]:parameter})
     return fig
\ No newline at end of file
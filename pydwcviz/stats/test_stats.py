@@ -1,7 +1,10 @@
 """
 Tests for stats module
 """
-from pydwcviz import stats
+import json
+import numpy as np
+import requests
+from pydwcviz import stats, synthetic
 
 def test_get_records():
     """Testing response type and request for statistics/records"""
@@ -40,4 +43,82 @@ def test_dist_env():
     assert stats.dist_env(stats.get_env(taxonid = 1071), parameter="sst", interactive=False).__class__.__name__ == "BarContainer"
 
     fig = stats.dist_env(stats.get_env(taxonid = 1071), parameter="depth", interactive=True)
-    assert fig.__class__.__name__ == "Figure"
\ No newline at end of file
+    assert fig.__class__.__name__ == "Figure"
+
+def test_get_many(stub, monkeypatch):
+    """Test concurrent batch requests keep input order and report failures per item"""
+    monkeypatch.setattr(stats.stats, "obis_base_url", stub.url)
+
+    def route(handler):
+        if "taxonid=2" in handler.path:
+            return 404, {}, b""
+        return 200, {}, json.dumps([{"year": 2000, "records": len(handler.path)}]).encode()
+    stub.route = route
+
+    res = stats.get_many("years", [{"taxonid": 1}, {"taxonid": 2}, {"taxonid": 10}], concurrency=2, rate=100)
+    assert res[0] == [{"year": 2000, "records": len("/statistics/years?taxonid=1")}]
+    assert isinstance(res[1], requests.HTTPError)
+    assert res[2] == [{"year": 2000, "records": len("/statistics/years?taxonid=10")}]
+
+def test_columnar_results(stub, monkeypatch):
+    """Test typed columnar results and plotting from them"""
+    monkeypatch.setattr(stats.stats, "obis_base_url", stub.url)
+    payloads = {
+        "/statistics/years": [{"year": 2000, "records": 3}, {"year": 2001, "records": 5}],
+        "/statistics/env": {
+            "sst": [{"sst": 10, "records": 2}, {"sst": 11, "records": 4}],
+            "sss": [{"sss": 35, "records": 6}],
+            "depth": [{"depth": 0, "records": 1}, {"depth": 10, "records": 5}],
+        },
+    }
+    stub.route = lambda handler: (200, {}, json.dumps(payloads[handler.path.split("?")[0]]).encode())
+
+    years = stats.get_years(taxonid=1071, columnar=True)
+    assert years.records.dtype == "int32"
+    assert years.frame is years.frame
+    assert stats.dist_years(years, interactive=True).__class__.__name__ == "Figure"
+
+    env = stats.get_env(taxonid=1071, columnar=True)
+    assert env.bins["sst"].dtype == "float64"
+    assert list(env.frame("depth").columns) == ["depth", "records"]
+    assert stats.dist_env(env, parameter="depth", interactive=True).__class__.__name__ == "Figure"
+    assert env.frame("depth")["depth"].dtype == "float64"
+
+def test_local_summaries(tmp_path):
+    """Test the local summaries against groupby counts, from a DataFrame and a Parquet dataset"""
+    data = synthetic.occurrences(3000, seed=7).assign(
+        sst=lambda df: np.linspace(-2, 30, len(df.index)),
+        flags=lambda df: np.where(df.index % 3 == 0, "ON_LAND,NO_DEPTH", None),
+        absence=lambda df: df.index % 10 == 0,
+    )
+    data.loc[data.index % 7 == 0, "depth"] = np.nan
+    presence = data[~data.absence]
+
+    years = stats.local.years(data)
+    assert years == [{"year": y, "records": n} for y, n in presence.groupby("date_year").size().items()]
+    assert stats.dist_years(stats.local.years(data, columnar=True), interactive=True).__class__.__name__ == "Figure"
+    # records dated by eventDate only are counted in the same years
+    dated = data.drop(columns="date_year").assign(eventDate=data.eventDate.dt.strftime("%Y-%m-%d"))
+    assert stats.local.years(dated) == years
+
+    env = stats.local.env(data, bins={"depth": 100})
+    assert sum(row["records"] for row in env["depth"]) == presence.depth.notna().sum()
+    assert env["depth"][0] == {"depth": 0, "records": int((presence.depth < 100).sum())}
+    assert env["sss"] == []
+    assert stats.dist_env(env, parameter="sst", interactive=True).__class__.__name__ == "Figure"
+
+    qc = stats.local.qc(data, absence="include")
+    assert qc["records"] == len(data.index)
+    assert qc["flags"] == {"ON_LAND": 1000, "NO_DEPTH": 1000}
+    assert qc["missing"]["depth"] == data.depth.isna().sum()
+    assert qc["absence"] == data.absence.sum()
+
+    composition = stats.local.composition(data, columnar=True)
+    expected = presence.species.value_counts()
+    assert list(composition.frame("species").records[:5]) == list(expected.iloc[:5])
+
+    data.to_parquet(tmp_path / "data.parquet")
+    out = stats.local.summary(tmp_path / "data.parquet", bins={"depth": 100})
+    assert out["years"] == years
+    assert out["env"] == env
+    assert out["qc"]["flags"] == stats.local.qc(data)["flags"]
@@ -0,0 +1,97 @@
+"""
+synthetic: seeded generator of realistic Darwin Core occurrence data for tests and benchmarks.
+"""
+import numpy as np
+import pandas as pd
+from .schema import ranks
+
+kingdoms = ["Animalia", "Plantae", "Chromista", "Bacteria", "Fungi", "Protozoa"]
+
+def taxonomy(n_species=2000):
+    """
+    Build a consistent kingdom to species hierarchy.
+
+    :param n_species: [Integer] Number of species.
+
+    :return: A DataFrame with one row per species and one column per rank
+    """
+    species = np.arange(n_species)
+    genus = species // 4
+    family = genus // 4
+    order = family // 3
+    cls = order // 3
+    phylum = cls // 3
+    return pd.DataFrame({
+        "kingdom": np.array(kingdoms, dtype=object)[phylum % len(kingdoms)],
+        "phylum": [f"Phylum{i}" for i in phylum],
+        "class": [f"Class{i}" for i in cls],
+        "order": [f"Order{i}" for i in order],
+        "family": [f"Family{i}" for i in family],
+        "genus": [f"Genus{i}" for i in genus],
+        "species": [f"Genus{g} species{s}" for g, s in zip(genus, species)],
+    })
+
+def occurrences(n, seed=0, n_species=2000, n_clusters=50, unidentified=0.1, chunk=0):
+    """
+    Generate a Darwin Core occurrence table.
+
+    :param n: [Integer] Number of records.
+    :param seed: [Integer] Seed of the random generator, the same seed gives the same table.
+    :param n_species: [Integer] Number of species to draw from.
+    :param n_clusters: [Integer] Number of sampling hot spots the coordinates cluster around.
+    :param unidentified: [Float] Share of records only identified to genus (species is NaN).
+    :param chunk: [Integer] Draw a different set of records over the same species and hot spots.
+
+    :return: A DataFrame with id, scientificName, the taxonomy columns, decimalLongitude,
+        decimalLatitude, eventDate, date_year and depth
+
+    Species abundance follows a Zipf-like law, so a few species make up most
+    records and most species are rare, as in real survey data.
+
+    Usage::
+
+        from pydwcviz import synthetic, diversity
+        diversity.es50(synthetic.occurrences(100_000, seed=1), 1)
+    """
+    layout = np.random.default_rng(seed)
+    centres = np.column_stack([layout.uniform(-180, 180, n_clusters), layout.uniform(-70, 70, n_clusters)])
+    spread = layout.uniform(0.5, 8, n_clusters)
+    taxa = taxonomy(n_species)
+
+    rng = np.random.default_rng([seed, chunk])
+    weights = 1 / np.arange(1, n_species + 1) ** 1.1
+    taxon = rng.choice(n_species, size=n, p=weights / weights.sum())
+    # most records of a species come from its home hot spot, the rest from anywhere
+    cluster = np.where(rng.random(n) < 0.3, rng.integers(0, n_clusters, n), taxon * 7919 % n_clusters)
+
+    lon = centres[cluster, 0] + rng.normal(0, 1, n) * spread[cluster]
+    lat = centres[cluster, 1] + rng.normal(0, 1, n) * spread[cluster] / 2
+    lon = (lon + 180) % 360 - 180
+    lat = np.clip(lat, -90, 90)
+
+    df = pd.DataFrame({"id": np.arange(n, dtype=np.int64)})
+    for rank in ranks:
+        df[rank] = taxa[rank].to_numpy()[taxon]
+    df.loc[rng.random(n) < unidentified, "species"] = np.nan
+    df["scientificName"] = df["species"].fillna(df["genus"])
+    df["decimalLongitude"] = np.round(lon, 4)
+    df["decimalLatitude"] = np.round(lat, 4)
+    days = rng.integers(0, 365 * 70, n)
+    df["eventDate"] = np.datetime64("1955-01-01") + days.astype("timedelta64[D]")
+    df["date_year"] = df["eventDate"].dt.year.astype(np.int32)
+    df["depth"] = np.round(rng.lognormal(3, 1.5, n), 1)
+    return df
+
+def chunks(n, chunksize=1_000_000, seed=0, **kwargs):
+    """
+    Generate ``n`` records as a stream of DataFrame chunks, for scales that do not fit in memory.
+
+    :param n: [Integer] Total number of records.
+    :param chunksize: [Integer] Records per chunk.
+    :param seed: [Integer] Seed of the random generator.
+    :param kwargs: Further arguments to occurrences().
+    """
+    for i, start in enumerate(range(0, n, chunksize)):
+        chunk = occurrences(min(chunksize, n - start), seed=seed, chunk=i, **kwargs)
+        chunk["id"] += start
+        yield chunk
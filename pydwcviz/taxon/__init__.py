@@ -1,6 +1,8 @@
-from .taxon import plot_dist, latdist
+from .taxon import plot_dist, hierarchy, latdist, latcounts
 
 __all__ = [
     "plot_dist",
+    "hierarchy",
     "latdist",
+    "latcounts",
 ]
\ No newline at end of file
@@ -1,19 +1,75 @@
 """
 taxon: visualize taxonomic distributions
+
+matplotlib and plotly are only imported when a plot is drawn.
 """
-try:
-    import plotly.express as px
-except:
-    print("This module uses plotly to plot a sunburst plot of taxonomic distribution. We could not find a version of plotly on your system.")
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+from .. import metrics
+from ..schema import ranks
+
+# most taxa drawn as their own trace by the interactive latdist, the others are summed into "other"
+max_traces = 50
 
-def plot_dist(data, **kwargs):
+def hierarchy(data, max_depth=7, min_count=1, top_k=None):
+    """
+    Aggregate occurrence records into the kingdom to species tree drawn by :func:`plot_dist`.
+
+    :param data: [Pandas DataFrame] A Pandas DataFrame of occurrence records with
+        columns ["kingdom", "phylum", "class", "order", "family", "genus","species"].
+    :param max_depth: [Integer] Number of ranks to descend, 1 (kingdom) to 7 (species).
+    :param min_count: [Integer] Drop nodes, and everything below them, with fewer records.
+    :param top_k: [Integer] Keep only the ``top_k`` children with the most records under every node.
+
+    :return: A DataFrame with one row per node and columns ids, parents, labels and values,
+        parents before their children. Missing ranks are labelled "None".
+
+    Records are counted once per distinct path with a single groupby, every further step
+    works on that table, so the cost of pruning and drawing depends on the size of the tree.
+    """
+    if not 1 <= max_depth <= len(ranks):
+        raise ValueError(f"Argument 'max_depth' must be between 1 and {len(ranks)}.")
+    levels = ranks[:max_depth]
+    counts = data.groupby(levels, dropna=False, observed=True, sort=False).size()
+    tree = counts.reset_index(name="values")
+    tree[levels] = tree[levels].astype(object).fillna("None").astype(str)
+
+    nodes = []
+    for depth in range(1, max_depth + 1):
+        path = levels[:depth]
+        node = tree.groupby(path, sort=False)["values"].sum().reset_index()
+        node = node[node["values"] >= min_count]
+        if top_k is not None:
+            node = node.sort_values("values", ascending=False, kind="stable")
+            rank = node.groupby(path[:-1], sort=False).cumcount() if depth > 1 else np.arange(len(node))
+            node = node[rank < top_k]
+        # descend only below the nodes that were kept
+        tree = tree.merge(node[path], on=path)
+
+        parents = node[path[0]] if depth > 1 else pd.Series("", index=node.index)
+        for level in path[1:-1]:
+            parents = parents + "/" + node[level]
+        nodes.append(pd.DataFrame({
+            "ids": parents + "/" + node[path[-1]] if depth > 1 else node[path[0]],
+            "parents": parents,
+            "labels": node[path[-1]],
+            "values": node["values"],
+        }))
+    return pd.concat(nodes, ignore_index=True)
+
+def plot_dist(data, max_depth=7, min_count=1, top_k=None, **kwargs):
     """
     Generates a plotly sunburst plot from a DataFrame of occurrence records.
 
     :param data: [Pandas DataFrame] A Pandas DataFrame of occurrence records with 
         columns ["kingdom", "phylum", "class", "order", "family", "genus","species"].
+    :param max_depth: [Integer] Number of ranks to draw, 1 (kingdom) to 7 (species).
+    :param min_count: [Integer] Leave out taxa with fewer records.
+    :param top_k: [Integer] Draw only the ``top_k`` taxa with the most records under every node.
+
+    The records are aggregated into the taxonomic tree first (see :func:`hierarchy`), so
+    the figure holds one entry per drawn taxon rather than one per record. Pruned taxa
+    leave a gap in their parent's ring.
 
     :return: A plotly sunburst plot figure object
 
@@ -27,25 +83,70 @@ def plot_dist(data, **kwargs):
         
         # show the figure
         fig.show()
+
+        # large datasets: down to genus, the 10 largest children of every taxon
+        fig = taxon.plot_dist(data, max_depth=6, top_k=10)
     """
+    import plotly.graph_objects as go
 
-    fig = px.sunburst(
-        data.fillna(
-            {'phylum':'None',
-            'order':"None",
-            'class':"None",
-            'family':"None",
-            'genus':"None",
-            'species':"None"
-            }),
-        path=["kingdom", "phylum", "class", "order", "family", "genus","species"],
-        width=750, height=750,
-        title="Taxonomic Distribution",
-    )
-    fig.update_traces(textinfo="label+percent parent")
+    metrics.count("taxon.records", len(data.index))
+    with metrics.stage("taxon.aggregate"):
+        tree = hierarchy(data, max_depth, min_count, top_k)
+    with metrics.stage("taxon.draw"):
+        fig = go.Figure(
+            go.Sunburst(
+                ids=tree["ids"], parents=tree["parents"], labels=tree["labels"], values=tree["values"],
+                branchvalues="total",
+            ),
+            layout={"width": 750, "height": 750, "title": "Taxonomic Distribution"},
+        )
+        fig.update_traces(textinfo="label+percent parent")
     return fig
 
-def latdist(data, level="Species", bbox_to_anchor = [1.5, 1.2], interactive=False):
+def latcounts(data, level="species", band=1.0, top=None):
+    """
+    Count records per taxon and latitude band in a single pass.
+
+    :param data: [Pandas DataFrame] A Pandas DataFrame of occurrence records with
+        columns decimalLatitude and ``level``.
+    :param level: [String] Taxonomic level to count at. One of
+        ["kingdom", "phylum", "class", "order", "family", "genus","species"].
+    :param band: [Float] Height of a latitude band in degrees.
+    :param top: [Integer] Keep the ``top`` taxa with the most records and add the rest up
+        in a row labelled "other". None keeps every taxon.
+
+    :return: A DataFrame with one row per taxon, ordered by decreasing number of records,
+        and one column per latitude band between the southernmost and northernmost record,
+        labelled with the band centre
+
+    Usage::
+
+        from pydwcviz import taxon
+        taxon.latcounts(data, level="genus", band=5, top=10)
+    """
+    lat = data["decimalLatitude"].to_numpy(dtype=float, na_value=np.nan)
+    codes, taxa = pd.factorize(data[level])
+    valid = (codes >= 0) & np.isfinite(lat)
+    nbands = int(np.ceil(180 / band))
+    bands = np.clip(((lat[valid] + 90) // band).astype(np.int64), 0, nbands - 1)
+    if not len(bands):
+        return pd.DataFrame(index=pd.Index([], name=level), columns=pd.Index([], name="lat"), dtype=np.int64)
+
+    low, high = bands.min(), bands.max()
+    width = high - low + 1
+    counts = np.bincount(codes[valid] * width + bands - low, minlength=len(taxa) * width).reshape(len(taxa), width)
+
+    order = np.argsort(-counts.sum(axis=1), kind="stable")
+    labels = np.asarray(taxa, dtype=object)[order]
+    counts = counts[order]
+    if top is not None and len(labels) > top:
+        counts = np.vstack([counts[:top], counts[top:].sum(axis=0, keepdims=True)])
+        labels = np.append(labels[:top], "other")
+
+    centres = -90 + (np.arange(low, high + 1) + 0.5) * band
+    return pd.DataFrame(counts, index=pd.Index(labels, name=level), columns=pd.Index(centres, name="lat"))
+
+def latdist(data, level="Species", bbox_to_anchor = [1.5, 1.2], interactive=False, band=1.0, top=None):
     """
     Generates a line plot of taxonomic distribution against latitude at a taxonomic level
     
@@ -55,8 +156,16 @@ def latdist(data, level="Species", bbox_to_anchor = [1.5, 1.2], interactive=Fals
         ["kingdom", "phylum", "class", "order", "family", "genus","species"].
     :param bbox_to_anchor: [List <Float>] Position to anchor bounding box for easy viewing of legend.
     :param interactive: [Boolean] If True, the matplotlib plot. If False then plotly interactive plot
+    :param band: [Float] Height in degrees of the latitude bands records are counted in.
+    :param top: [Integer] Draw only the ``top`` taxa with the most records and one "other" line
+        for the rest. None draws every taxon with matplotlib and the :data:`max_traces` taxa
+        with the most records with plotly.
     :return: A Matplotlib axes object.
 
+    Counts come from :func:`latcounts`. With matplotlib all lines are drawn at once as a
+    single ``LineCollection`` and the legend is only drawn for up to 50 lines; plotly draws
+    one WebGL trace per line, so its number of lines is capped.
+
     Usage::
 
         from pydwcviz import taxon
@@ -68,26 +177,44 @@ def latdist(data, level="Species", bbox_to_anchor = [1.5, 1.2], interactive=Fals
         # interactive plot using plotly
         fig = taxon.latdist(occurrences.search(scientificname = "Mola mola").execute(), level="species", interactive=True)
         fig.show()
+
+        # the 10 most recorded genera in 5 degree bands
+        taxon.latdist(data, level="genus", band=5, top=10)
     """
-    # groupby a certain level
-    l = data.groupby([level, "decimalLatitude"]).scientificName.count()
-    df = pd.DataFrame(l)
-    df.loc[:,[level, "lat"]] = l.index.tolist()
-    df.rename(columns = {'scientificName':'count'}, inplace=True)
+    metrics.count("taxon.records", len(data.index))
+    if interactive and top is None:
+        top = max_traces
+    with metrics.stage("taxon.aggregate"):
+        counts = latcounts(data, level, band, top)
+    lat = counts.columns.to_numpy(dtype=float)
+    labels = [str(label) for label in counts.index]
+    values = counts.to_numpy()
 
-    df.sort_values("lat", inplace=True)
-    
-    if not interactive:
-        fig, ax = plt.subplots(1,1,sharex=True,sharey=True)
-        for i in df[level].unique():
-            df[df[level]==i].plot(x = "count", y="lat", label=i, ax = ax)
-        
-        plt.ylabel("latitude")
-        plt.title("Latitude v/s Occurrence Counts")
-        plt.legend(bbox_to_anchor=bbox_to_anchor)
-
-        return ax
-    else:
-        fig = px.line(df, x = "count",y ="lat", color=level)
-        fig.update_layout(title="Latitude v/s Occurrence Counts")
-        return fig
+    with metrics.stage("taxon.draw"):
+        if not interactive:
+            import matplotlib.pyplot as plt
+            from matplotlib.collections import LineCollection
+            from matplotlib.lines import Line2D
+
+            fig, ax = plt.subplots(1,1,sharex=True,sharey=True)
+            # (taxa, bands, 2) array of (count, lat) vertices, one polyline per taxon
+            segments = np.stack([values, np.broadcast_to(lat, values.shape)], axis=-1)
+            colors = plt.get_cmap("tab10")(np.arange(len(labels)) % 10)
+            ax.add_collection(LineCollection(segments, colors=colors))
+            ax.autoscale()
+
+            plt.ylabel("latitude")
+            plt.xlabel("count")
+            plt.title("Latitude v/s Occurrence Counts")
+            if 0 < len(labels) <= 50:
+                handles = [Line2D([], [], color=color) for color in colors]
+                plt.legend(handles, labels, bbox_to_anchor=bbox_to_anchor)
+
+            return ax
+        else:
+            import plotly.graph_objects as go
+            fig = go.Figure(
+                data=[go.Scattergl(x=row, y=lat, mode="lines", name=label) for label, row in zip(labels, values)],
+                layout={"title": "Latitude v/s Occurrence Counts", "xaxis_title": "count", "yaxis_title": "lat", "legend_title": level},
+            )
+            return fig
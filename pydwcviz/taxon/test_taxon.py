@@ -2,7 +2,8 @@
 Tests for taxon module
 """
 
-from pydwcviz import taxon
+import numpy as np
+from pydwcviz import taxon, synthetic
 from pyobis import occurrences
 
 def test_plot_dist():
@@ -16,3 +17,52 @@ def test_latdist():
 
     fig = taxon.latdist(occurrences.search(scientificname = "Mola mola", size=100).execute(), level="species", interactive=True)
     assert fig.__class__.__name__ == "Figure"
+
+def test_latcounts():
+    """Test single-pass latitude band counts and the top-N collapse"""
+    data = synthetic.occurrences(5000, seed=3)
+    counts = taxon.latcounts(data, level="genus", band=10)
+
+    assert counts.to_numpy().sum() == data.genus.notna().sum()
+    assert (np.diff(counts.sum(axis=1)) <= 0).all()
+    expected = data.groupby(["genus", (data.decimalLatitude + 90) // 10]).size()
+    genus, band = expected.index[0]
+    assert counts.loc[genus, -90 + (band + 0.5) * 10] == expected.iloc[0]
+
+    top = taxon.latcounts(data, level="genus", band=10, top=5)
+    assert list(top.index) == list(counts.index[:5]) + ["other"]
+    assert (top.sum() == counts.sum()).all()
+
+def test_latdist_offline():
+    """Test latitude distribution drawing on synthetic data - both interactive and non-interactive"""
+    data = synthetic.occurrences(5000, seed=3)
+    ax = taxon.latdist(data, level="species", top=10)
+    assert ax.__class__.__name__ == "Axes"
+    assert len(ax.collections[0].get_segments()) == 11
+
+    fig = taxon.latdist(data, level="genus", interactive=True, band=5)
+    assert fig.__class__.__name__ == "Figure"
+    assert len(fig.data) == taxon.taxon.max_traces + 1
+    assert fig.data[-1].name == "other"
+    assert len(taxon.latdist(data, level="phylum", interactive=True).data) == data.phylum.nunique()
+
+def test_hierarchy():
+    """Test the pre-aggregated taxonomic tree and its pruning options"""
+    data = synthetic.occurrences(5000, seed=3)
+    tree = taxon.hierarchy(data)
+
+    assert tree.ids.is_unique
+    assert set(tree.parents) - set(tree.ids) == {""}
+    assert tree[tree.parents == ""]["values"].sum() == len(data.index)
+    leaves = tree[tree.ids.str.count("/") == 6]
+    assert len(leaves) == len(data.fillna({"species": "None"}).groupby(taxon.taxon.ranks).size())
+
+    pruned = taxon.hierarchy(data, max_depth=4, min_count=20, top_k=2)
+    assert pruned.ids.str.count("/").max() == 3
+    assert (pruned["values"] >= 20).all()
+    assert pruned.groupby("parents").size().max() <= 2
+    assert set(pruned.parents) - set(pruned.ids) == {""}
+
+    fig = taxon.plot_dist(data, max_depth=4, top_k=2)
+    assert fig.__class__.__name__ == "Figure"
+    assert len(fig.data[0].ids) == len(taxon.hierarchy(data, max_depth=4, top_k=2).index)
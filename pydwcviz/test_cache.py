@@ -0,0 +1,62 @@
+"""
+Tests for the persistent response cache, run against a local stub of the API
+"""
+from pydwcviz import utils
+from pydwcviz.cache import ResponseCache
+
+def test_cache_hits_and_revalidation(stub, tmp_path):
+    """Testing that fresh responses are served from disk and stale ones are revalidated"""
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl=60, ttls={"/statistics/years": 0})
+    utils.set_cache(cache)
+
+    first = utils.get(f"{stub.url}/statistics", {"taxonid": 1, "areaid": None})
+    assert utils.get(f"{stub.url}/statistics", {"taxonid": 1}) == first
+    assert len(stub.requests) == 1
+
+    utils.get(f"{stub.url}/statistics/years", {"taxonid": 1})
+    assert utils.get(f"{stub.url}/statistics/years", {"taxonid": 1}) == {"path": "/statistics/years?taxonid=1"}
+    assert stub.requests[-1][1]["If-None-Match"] == '"v1"'
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["revalidated"] == 1
+    assert cache.stats()["entries"] == 2
+
+def test_cache_eviction(stub, tmp_path):
+    """Testing that the least recently used responses are evicted beyond max_size"""
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_size=100)
+    utils.set_cache(cache)
+
+    for taxonid in range(5):
+        utils.get(f"{stub.url}/statistics", {"taxonid": taxonid})
+
+    assert cache.stats()["size"] <= 100
+    assert cache.lookup(f"{stub.url}/statistics", {"taxonid": 4}) is not None
+    assert cache.lookup(f"{stub.url}/statistics", {"taxonid": 0}) is None
+
+def test_cache_with_memo(stub, tmp_path, monkeypatch):
+    """Testing that the default memo does not outlive the cache TTL, so expiry and revalidation apply"""
+    monkeypatch.setattr(utils, "memo", utils.Memo())
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl=0)
+    utils.set_cache(cache)
+
+    first = utils.get(f"{stub.url}/statistics", {"taxonid": 1})
+    assert utils.get(f"{stub.url}/statistics", {"taxonid": 1}) == first
+    assert len(stub.requests) == 2
+    assert stub.requests[-1][1]["If-None-Match"] == '"v1"'
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["revalidated"] == 1
+
+    utils.set_cache(ResponseCache(tmp_path / "long.sqlite", ttl=60))
+    utils.get(f"{stub.url}/statistics", {"taxonid": 2})
+    utils.get(f"{stub.url}/statistics", {"taxonid": 2})
+    assert len(stub.requests) == 3
+
+def test_cache_bypass(stub, tmp_path):
+    """Testing that get(cache=False) neither reads nor stores the persistent cache"""
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    utils.set_cache(cache)
+
+    utils.get(f"{stub.url}/occurrence", {"size": 10}, memoize=False, cache=False)
+    utils.get(f"{stub.url}/occurrence", {"size": 10}, memoize=False, cache=False)
+    assert len(stub.requests) == 2
+    assert cache.stats() == {"hits": 0, "misses": 0, "revalidated": 0, "entries": 0, "size": 0}
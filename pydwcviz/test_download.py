@@ -0,0 +1,121 @@
+"""
+Tests for the bulk occurrence downloader, run against a local stub of the occurrence endpoint
+"""
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from pydwcviz import download, synthetic, utils
+from pydwcviz.cache import ResponseCache
+
+def _endpoint(stub, data, fail_after=None):
+    """
+    Serve ``data`` like /occurrence: filtered by date, sorted by id and paged with ``after``,
+    leaving out the null fields of every record
+    """
+    def occurrence(handler):
+        if fail_after is not None and len(stub.requests) > fail_after:
+            return 500, {}, b""
+        query = {key: values[0] for key, values in parse_qs(urlparse(handler.path).query).items()}
+        page = data
+        if "startdate" in query:
+            page = page[(page.eventDate >= query["startdate"]) & (page.eventDate <= query["enddate"])]
+        if "after" in query:
+            page = page[page.id > query["after"]]
+        page = page.sort_values("id").head(int(query["size"]))
+        results = json.loads(page.to_json(orient="records", date_format="iso"))
+        body = {"total": len(page.index), "results": [{k: v for k, v in r.items() if v is not None} for r in results]}
+        return 200, {}, json.dumps(body).encode()
+    stub.route = occurrence
+
+def _records():
+    data = synthetic.occurrences(2500, seed=6)
+    data["id"] = data["id"].map("occ-{:06d}".format)
+    return data
+
+def test_date_shards():
+    """Testing that date shards cover the range without overlap"""
+    shards = download.date_shards("2000-01-01", "2000-12-31", 4)
+    assert shards[0] == {"startdate": "2000-01-01", "enddate": "2000-03-31"}
+    assert shards[1]["startdate"] == "2000-04-01"
+    assert shards[-1]["enddate"] == "2000-12-31"
+    assert len(download.date_shards("2000-01-01", "2000-01-02", 10)) == 2
+    assert len(download.tile_shards(90)) == 8
+
+def test_download(stub, tmp_path):
+    """Testing a sharded, paged download into Parquet"""
+    data = _records()
+    _endpoint(stub, data)
+    url = f"{stub.url}/occurrence"
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    utils.set_cache(cache)
+
+    progress = download.download(
+        tmp_path / "mola", shards=download.date_shards("1955-01-01", "2025-12-31", 5), size=200, workers=3,
+        url=url, scientificname="Mola mola", columns=["id", "species", "decimalLongitude", "decimalLatitude"],
+    )
+    assert progress.done.all()
+    assert progress.records.sum() == len(data.index)
+    # pages go to Parquet only, never to the response cache
+    assert cache.stats()["entries"] == 0
+
+    records = download.read(tmp_path / "mola")
+    assert sorted(records.id) == sorted(data.id)
+    assert list(records.columns) == ["id", "species", "decimalLongitude", "decimalLatitude"]
+    assert all("scientificname=Mola+mola" in path for path, headers in stub.requests)
+
+    # a finished download is not fetched again
+    requests_made = len(stub.requests)
+    download.download(
+        tmp_path / "mola", shards=download.date_shards("1955-01-01", "2025-12-31", 5), size=200, workers=3,
+        url=url, scientificname="Mola mola", columns=["id", "species", "decimalLongitude", "decimalLatitude"],
+    )
+    assert len(stub.requests) == requests_made
+    with pytest.raises(ValueError):
+        download.download(tmp_path / "mola", size=100, url=url, scientificname="Mola mola")
+
+def test_download_resume(stub, tmp_path):
+    """Testing that an interrupted download resumes from its checkpoint without duplicates"""
+    data = _records()
+    _endpoint(stub, data, fail_after=6)
+    session = utils.make_session(retries=0)
+    url = f"{stub.url}/occurrence"
+    shards = download.date_shards("1955-01-01", "2025-12-31", 2)
+
+    with pytest.raises(requests.HTTPError):
+        download.download(tmp_path / "all", shards=shards, size=300, workers=2, url=url, session=session)
+    partial = download.read(tmp_path / "all")
+    assert 0 < len(partial.index) < len(data.index)
+
+    _endpoint(stub, data)
+    stub.requests.clear()
+    progress = download.download(tmp_path / "all", shards=shards, size=300, workers=2, url=url, session=session)
+    assert progress.done.all()
+    assert len(stub.requests) < len(data.index) / 300 + 2
+    records = download.read(tmp_path / "all")
+    assert sorted(records.id) == sorted(data.id)
+    assert records.decimalLatitude.dtype == "float64"
+
+def test_download_schema(stub, tmp_path):
+    """Testing that pages missing a field or holding only nulls in it share the schema of the others"""
+    data = _records().sort_values("id", ignore_index=True)
+    # a first page of genus-only records and a second one without depths
+    data.loc[:99, "species"] = None
+    data.loc[100:199, "depth"] = None
+    _endpoint(stub, data)
+    url = f"{stub.url}/occurrence"
+
+    download.download(tmp_path / "some", size=100, url=url, columns=["id", "species", "depth"])
+    records = download.read(tmp_path / "some")
+    assert list(records.columns) == ["id", "species", "depth"]
+    records = records.sort_values("id", ignore_index=True)
+    assert records.species.isna().equals(data.species.isna())
+    assert records.depth.isna().equals(data.depth.isna())
+
+    download.download(tmp_path / "all", size=100, url=url)
+    records = download.read(tmp_path / "all", columns=["id", "species", "depth", "date_year"])
+    assert sorted(records.id) == sorted(data.id)
+    assert records.depth.dtype == "float32"
+    assert records.date_year.dtype == "Int16"
@@ -0,0 +1,107 @@
+"""
+Tests for dwca module
+"""
+import zipfile
+import numpy as np
+import pandas as pd
+from pydwcviz import dwca, diversity, synthetic
+
+meta = """<?xml version="1.0" encoding="UTF-8"?>
+<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="eml.xml">
+  <core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy="" ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Event">
+    <files><location>event.txt</location></files>
+    <id index="0"/>
+  </core>
+  <extension encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy="" ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">
+    <files><location>occurrence.txt</location></files>
+    <coreid index="0"/>
+{fields}
+    <field term="http://rs.tdwg.org/dwc/terms/basisOfRecord" default="HumanObservation"/>
+  </extension>
+</archive>
+"""
+
+def _archive(tmp_path, n=1000):
+    """Write synthetic records as an event core archive with an occurrence extension"""
+    data = synthetic.occurrences(n, seed=5).rename(columns={"date_year": "year"})
+    data["eventID"] = "event" + (data["id"] // 10).astype(str)
+    columns = ["eventID", "id", "decimalLongitude", "decimalLatitude", "year"] + synthetic.ranks
+    fields = "\n".join(
+        f'    <field index="{i}" term="http://rs.tdwg.org/dwc/terms/{"occurrenceID" if term == "id" else term}"/>'
+        for i, term in enumerate(columns) if i
+    )
+    path = tmp_path / "export.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("meta.xml", meta.replace("{fields}", fields))
+        archive.writestr("event.txt", "id\n")
+        archive.writestr("occurrence.txt", data[columns].to_csv(sep="\t", index=False))
+    return path, data
+
+def test_archive_chunks(tmp_path):
+    """Testing meta.xml parsing, column projection and dtypes of streamed chunks"""
+    path, data = _archive(tmp_path)
+    archive = dwca.Archive(path)
+
+    assert archive.location == "occurrence.txt"
+    assert archive.columns[:2] == ["id", "occurrenceID"]
+    assert archive.columns[-1] == "basisOfRecord"
+
+    chunks = list(archive.chunks(columns=dwca.terms["diversity"] + ["basisOfRecord"], chunksize=300))
+    assert [len(chunk.index) for chunk in chunks] == [300, 300, 300, 100]
+    assert list(chunks[0].columns) == ["id", "decimalLongitude", "decimalLatitude", "species", "basisOfRecord"]
+    assert chunks[0].decimalLatitude.dtype == np.float64
+    assert isinstance(chunks[0].species.dtype, pd.CategoricalDtype)
+    assert (chunks[-1].basisOfRecord == "HumanObservation").all()
+
+    records = archive.read(columns=["occurrenceID", "species", "year"], chunksize=300)
+    assert records.year.dtype == "Int32"
+    assert list(records.species.astype(object).fillna("")) == list(data.species.fillna(""))
+    assert np.array_equal(records.year.to_numpy(), data.year.to_numpy())
+
+def test_archive_shared_index(tmp_path):
+    """Testing an occurrence core whose id and occurrenceID share the first column"""
+    data = synthetic.occurrences(200, seed=5).rename(columns={"date_year": "year"})
+    columns = ["id", "decimalLongitude", "decimalLatitude", "year", "species"]
+    fields = "\n".join(
+        f'    <field index="{i}" term="http://rs.tdwg.org/dwc/terms/{"occurrenceID" if term == "id" else term}"/>'
+        for i, term in enumerate(columns)
+    )
+    core = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<archive xmlns="http://rs.tdwg.org/dwc/text/">\n'
+        '  <core fieldsTerminatedBy="\\t" fieldsEnclosedBy="" ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">\n'
+        f'    <files><location>occurrence.txt</location></files>\n    <id index="0"/>\n{fields}\n  </core>\n</archive>\n'
+    )
+    path = tmp_path / "core.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("meta.xml", core)
+        archive.writestr("occurrence.txt", data[columns].to_csv(sep="\t", index=False))
+    archive = dwca.Archive(path)
+
+    assert archive.columns[:2] == ["id", "occurrenceID"]
+    records = archive.read()
+    assert list(records.columns) == ["id", "occurrenceID", "decimalLongitude", "decimalLatitude", "year", "species"]
+    assert list(records.occurrenceID) == list(data.id.astype(str))
+    assert list(records.id) == list(records.occurrenceID)
+
+    archive.to_parquet(tmp_path / "parquet")
+    assert list(dwca.read_parquet(tmp_path / "parquet", columns=["id", "occurrenceID"]).occurrenceID) == list(records.id)
+
+def test_archive_parquet(tmp_path):
+    """Testing the Parquet cache round trip, partitioning and streaming into the indices"""
+    path, data = _archive(tmp_path)
+    archive = dwca.Archive(path)
+
+    archive.to_parquet(tmp_path / "parquet", chunksize=400)
+    assert len(list((tmp_path / "parquet").iterdir())) == 3
+    records = dwca.read_parquet(tmp_path / "parquet", columns=dwca.terms["map"] + ["year"])
+    assert list(records.columns) == ["decimalLongitude", "decimalLatitude", "year"]
+    assert np.allclose(records.decimalLatitude, data.decimalLatitude)
+
+    archive.to_parquet(tmp_path / "years", partition_cols=["year"])
+    recent = dwca.read_parquet(tmp_path / "years", columns=["id", "year"], filters=[("year", ">=", 2000)])
+    assert len(recent.index) == (data.year >= 2000).sum()
+
+    pd.testing.assert_frame_equal(
+        diversity.shannon(archive.chunks(columns=dwca.terms["diversity"], chunksize=250), 1),
+        diversity.shannon(data, 1),
+    )
@@ -0,0 +1,50 @@
+"""
+Tests for grid module
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from pydwcviz.grid import Grid, DegreeGrid, GeohashGrid, EqualAreaGrid
+
+def test_degree_grid():
+    """Testing regular grid ids and their decoding"""
+    grid = DegreeGrid(0.5)
+    ids = grid.index([179.9, -180, 0.2, np.nan], [90, -90, 0.3, 1])
+    assert list(ids) == [259199, 0, 180 * 720 + 360, -1]
+    lon, lat = grid.centroids(ids[:3])
+    assert np.allclose(lon, [179.75, -179.75, 0.25])
+    assert np.allclose(lat, [89.75, -89.75, 0.25])
+
+def test_geohash_grid():
+    """Testing that geohash ids match the reference geohash encoding"""
+    grid = GeohashGrid(5)
+    ids = grid.index([-5.6], [42.6])
+    assert list(grid.to_string(ids)) == ["ezs42"]
+    west, south, east, north = grid.bounds(ids)
+    assert west[0] <= -5.6 <= east[0] and south[0] <= 42.6 <= north[0]
+
+def test_equal_area_grid():
+    """Testing that equal-area cells cover the same surface at any latitude"""
+    grid = EqualAreaGrid(1.0)
+    ids = grid.index([0.5, 10, 10], [0.5, 60, 89.9])
+    west, south, east, north = grid.bounds(ids)
+    area = (np.sin(np.radians(north)) - np.sin(np.radians(south))) * (east - west)
+    assert np.allclose(area, area[0])
+
+def test_assign():
+    """Testing the cell column added to a DataFrame, missing where coordinates are"""
+    df = pd.DataFrame({"decimalLongitude": [0.2, np.nan], "decimalLatitude": [0.3, 1.0]})
+    out = DegreeGrid(1).assign(df)
+    assert out.cell.dtype == "Int64"
+    assert out.cell.isna().tolist() == [False, True]
+
+def test_abstract_grid():
+    """Testing that a grid missing an override fails at instantiation"""
+    class RowGrid(Grid):
+        def _rows_cols(self, lon, lat):
+            return lat // 1, lon * 0
+
+    with pytest.raises(TypeError):
+        Grid()
+    with pytest.raises(TypeError):
+        RowGrid()
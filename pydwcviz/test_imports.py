@@ -0,0 +1,26 @@
+"""
+Import-time regression test: data-only modules must not load plotting or geo backends
+"""
+import subprocess
+import sys
+
+heavy = ["matplotlib", "plotly", "geopandas", "shapely", "scipy"]
+
+def test_data_paths_import_light():
+    """
+    Importing every module and computing Shannon's index loads only pandas/numpy/requests;
+    ES50 needs scipy.special for its log-gamma terms but no plotting or geo backend
+    """
+    code = (
+        "import sys\n"
+        "import pandas as pd\n"
+        "import pydwcviz\n"
+        "from pydwcviz import stats, diversity, taxon, map\n"
+        "data = pd.DataFrame({'decimalLongitude': [0.0], 'decimalLatitude': [0.0], 'species': ['a'], 'id': [1]})\n"
+        "diversity.shannon(data)\n"
+        f"print('loaded:' + ','.join(m for m in {heavy!r} if m in sys.modules))\n"
+        "diversity.es50(data)\n"
+        f"print('loaded:' + ','.join(m for m in {heavy!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.splitlines()[-2:] == ["loaded:", "loaded:scipy"]
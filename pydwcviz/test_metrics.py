@@ -0,0 +1,72 @@
+"""
+Tests for the instrumentation layer
+"""
+import logging
+from contextlib import nullcontext
+
+from pydwcviz import diversity, metrics, synthetic, taxon, utils
+from pydwcviz.cache import ResponseCache
+
+def test_disabled():
+    """Testing that nothing is measured, nor any timer object built, while disabled"""
+    received = []
+    assert metrics.registry is None
+    assert isinstance(metrics.stage("diversity.count"), nullcontext)
+    metrics.count("http.bytes", 10)
+
+    def callback(*args):
+        received.append(args)
+
+    metrics.add_callback(callback)
+    try:
+        with metrics.stage("custom"):
+            pass
+        metrics.count("custom.rows", 3)
+    finally:
+        metrics.remove_callback(callback)
+    assert [(kind, name) for kind, name, value in received] == [("time", "custom"), ("count", "custom.rows")]
+    assert received[1][2] == 3
+
+def test_diversity_stages(caplog):
+    """Testing stage timers and counters of an index, and logging instead of printing"""
+    data = synthetic.occurrences(2000, seed=1)
+    with caplog.at_level(logging.INFO, logger="pydwcviz.diversity"), metrics.collect() as registry:
+        out = diversity.shannon(data, 1)
+        taxon.latcounts(data)
+        taxon.latdist(data, level="genus", interactive=True)
+    assert metrics.registry is None
+
+    assert registry.timers["diversity.count"][0] == 1
+    assert registry.timers["diversity.index"][1] > 0
+    assert registry.counters["diversity.cells"] == len(out.index)
+    assert registry.counters["diversity.dropped"] == data.species.isna().sum()
+    assert registry.timers["taxon.aggregate"][0] == 1
+    assert registry.counters["taxon.records"] == len(data.index)
+    assert "Not species records dropped" in caplog.text
+
+    frame = registry.frame()
+    assert set(frame.kind) == {"time", "count"}
+    assert frame.set_index("name").loc["diversity.cells", "value"] == len(out.index)
+
+def test_http_counters(stub, tmp_path, monkeypatch):
+    """Testing request, byte, cache and memo counters of get()"""
+    utils.set_cache(ResponseCache(path=str(tmp_path / "cache.sqlite"), ttl=0))
+    url = f"{stub.url}/statistics"
+    with metrics.collect() as registry:
+        utils.get(url, {"taxonid": 1})
+        utils.get(url, {"taxonid": 1})
+
+    assert registry.counters["http.requests"] == 2
+    assert registry.counters["cache.miss"] == 1
+    assert registry.counters["cache.revalidated"] == 1
+    assert registry.counters["http.bytes"] == len(b'{"path": "/statistics?taxonid=1"}')
+    assert registry.timers["http.request"][0] == 2
+    assert registry.timers["json.decode"][0] == 2
+
+    # the memo never outlives the cache TTL, so measure its hits without a cache
+    utils.set_cache(None)
+    monkeypatch.setattr(utils, "memo", utils.Memo())
+    with metrics.collect() as registry:
+        utils.get(url, {"taxonid": 2})
+        utils.get(url, {"taxonid": 2})
+    assert registry.counters["memo.hit"] == 1
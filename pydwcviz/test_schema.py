@@ -0,0 +1,76 @@
+"""
+Tests for the schema normalizer
+"""
+import numpy as np
+import pandas as pd
+from pydwcviz import schema, synthetic, diversity, taxon
+from pydwcviz.grid import DegreeGrid
+from pydwcviz.map.map import density
+
+def _records():
+    """Synthetic records with object string columns, as parsed from JSON or CSV"""
+    data = synthetic.occurrences(20000, seed=4)
+    for column in synthetic.ranks + ["scientificName"]:
+        data[column] = data[column].astype(object)
+    return data
+
+def test_canonical():
+    """Testing that schema variants are mapped onto canonical names only when these are missing"""
+    renames = schema.canonical(["gbifID", "decimallatitude", "Longitude", "year", "species"])
+    assert renames == {"gbifID": "id", "decimallatitude": "decimalLatitude", "Longitude": "decimalLongitude", "year": "date_year"}
+    assert schema.canonical(["id", "gbifID", "decimalLatitude", "latitude"]) == {}
+
+def test_normalize():
+    """Testing compact dtypes, memory reduction and that normalizing twice copies nothing"""
+    data = _records()
+    compact = schema.normalize(data.rename(columns={"id": "gbifID"}))
+
+    assert "id" in compact.columns and compact.gbifID.equals(data.id)
+    assert compact.decimalLatitude.dtype == np.float64
+    assert all(isinstance(compact[rank].dtype, pd.CategoricalDtype) for rank in synthetic.ranks)
+    assert data.memory_usage(deep=True).sum() > 3 * compact.memory_usage(deep=True).sum()
+    assert schema.normalize(compact) is compact
+    assert schema.normalize(data, dtype={"decimalLatitude": "float32"}).decimalLatitude.dtype == np.float32
+
+def test_normalize_keeps_aliases():
+    """Testing that the columns canonical ones are taken from are left in the frame"""
+    data = pd.DataFrame({"occurrenceID": ["a", "b"], "year": [1990, 2001], "lat": [1.0, 2.0], "species": ["x", "y"]})
+    out = schema.normalize(data)
+
+    assert list(out.columns[:4]) == list(data.columns)
+    assert out.occurrenceID.tolist() == ["a", "b"] and out.year.tolist() == [1990, 2001]
+    assert out.id.tolist() == ["a", "b"] and out.date_year.dtype == "Int16"
+    assert out.decimalLatitude.tolist() == [1.0, 2.0]
+    pd.testing.assert_frame_equal(data, pd.DataFrame({"occurrenceID": ["a", "b"], "year": [1990, 2001], "lat": [1.0, 2.0], "species": ["x", "y"]}))
+
+def test_cell_parity():
+    """Testing that normalized and float32 coordinates are binned into the same cells as the raw ones"""
+    data = synthetic.occurrences(20000, seed=6)
+    # coordinates with 2 decimals put many records on the rounding boundary of decimals=1
+    data["decimalLongitude"] = data.decimalLongitude.round(2)
+    data["decimalLatitude"] = data.decimalLatitude.round(2)
+    compact = schema.normalize(data)
+    single = schema.normalize(data, dtype={"decimalLongitude": "float32", "decimalLatitude": "float32"})
+
+    for decimals in [1, 2, 3]:
+        expected = diversity.shannon(data, decimals)
+        for frame in [compact, single]:
+            result = diversity.shannon(frame, decimals)
+            assert len(result.index) == len(expected.index)
+            assert np.allclose(result.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+        assert np.allclose(diversity.es50(single, decimals).esi, diversity.es50(data, decimals).esi)
+
+def test_public_functions():
+    """Testing that the analyses give the same results on the compact frame"""
+    data = _records()
+    compact = schema.normalize(data)
+
+    for index in [diversity.shannon, diversity.es50, diversity.richness]:
+        expected, result = index(data, 0), index(compact, 0)
+        assert np.allclose(result.iloc[:, 2], expected.iloc[:, 2])
+    assert np.allclose(diversity.es(compact, n=[10], decimals=0).es_10, diversity.es(data, n=[10], decimals=0).es_10, equal_nan=True)
+
+    pd.testing.assert_frame_equal(taxon.latcounts(compact, "genus", top=20), taxon.latcounts(data, "genus", top=20), check_index_type=False, check_column_type=False)
+    pd.testing.assert_frame_equal(taxon.hierarchy(compact), taxon.hierarchy(data))
+    assert (density(compact.decimalLongitude, compact.decimalLatitude)[2] == density(data.decimalLongitude, data.decimalLatitude)[2]).all()
+    assert DegreeGrid(1).assign(compact).cell.equals(DegreeGrid(1).assign(data).cell)
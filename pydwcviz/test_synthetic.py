@@ -0,0 +1,24 @@
+"""
+Tests for the synthetic occurrence generator
+"""
+import pandas as pd
+from pydwcviz import synthetic
+
+def test_occurrences_seeded():
+    """Testing that the generator is reproducible and yields a consistent taxonomy"""
+    df = synthetic.occurrences(5000, seed=3)
+    pd.testing.assert_frame_equal(df, synthetic.occurrences(5000, seed=3))
+
+    assert set(synthetic.ranks) <= set(df.columns)
+    assert df.decimalLatitude.between(-90, 90).all()
+    assert df.decimalLongitude.between(-180, 180).all()
+    assert df.dropna(subset=["species"]).groupby("species").genus.nunique().max() == 1
+    # skewed abundance: the most common species is far above the median one
+    counts = df.species.value_counts()
+    assert counts.iloc[0] > 20 * counts.median()
+
+def test_chunks():
+    """Testing that chunks cover the requested number of records with unique ids"""
+    chunks = list(synthetic.chunks(2500, chunksize=1000, seed=3))
+    assert [len(c.index) for c in chunks] == [1000, 1000, 500]
+    assert pd.concat(chunks).id.is_unique
@@ -0,0 +1,88 @@
+"""
+Tests for the HTTP session layer, run against a local stub of the API
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from pydwcviz import utils
+
+def test_get_retries_unavailable(stub):
+    """Testing that 429/5xx responses are retried, honouring Retry-After"""
+    def flaky(handler):
+        if len(stub.requests) < 3:
+            return 503, {"Retry-After": "0"}, b""
+        return 200, {}, json.dumps({"ok": True}).encode()
+    stub.route = flaky
+
+    session = utils.make_session(retries=3, backoff_factor=0)
+    assert utils.get(f"{stub.url}/statistics", {"taxonid": 1}, session=session) == {"ok": True}
+    assert len(stub.requests) == 3
+
+def test_get_gives_up(stub):
+    """Testing that retries are bounded and the last error is raised"""
+    stub.route = lambda handler: (429, {"Retry-After": "0"}, b"")
+
+    session = utils.make_session(retries=2, backoff_factor=0)
+    with pytest.raises(requests.HTTPError):
+        utils.get(f"{stub.url}/statistics", {"taxonid": 1}, session=session)
+    assert len(stub.requests) == 3
+
+def test_set_session(stub):
+    """Testing that get() uses the module-level session set by the caller"""
+    session = requests.Session()
+    session.headers["X-Test"] = "yes"
+    utils.set_session(session)
+    try:
+        utils.get(f"{stub.url}/statistics", {})
+    finally:
+        utils.configure_session()
+    assert stub.requests[0][1]["X-Test"] == "yes"
+
+def test_memo_coalesces(stub, monkeypatch):
+    """Testing that identical requests, including concurrent ones, share one network call"""
+    monkeypatch.setattr(utils, "memo", utils.Memo(maxsize=2))
+    release = threading.Event()
+
+    def slow(handler):
+        release.wait(5)
+        return 200, {}, json.dumps({"path": handler.path}).encode()
+    stub.route = slow
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(utils.get, f"{stub.url}/statistics", {"taxonid": 1, "areaid": None}) for _ in range(4)]
+        time.sleep(0.2)
+        release.set()
+        results = [f.result() for f in futures]
+    assert len(stub.requests) == 1
+    assert all(r == results[0] for r in results)
+
+    results[0]["path"] = "modified"
+    assert utils.get(f"{stub.url}/statistics", {"taxonid": "1"}) == results[1]
+    assert len(stub.requests) == 1
+
+    utils.get(f"{stub.url}/statistics", {"taxonid": 2})
+    utils.get(f"{stub.url}/statistics", {"taxonid": 3})
+    utils.get(f"{stub.url}/statistics", {"taxonid": 1})
+    assert len(stub.requests) == 4
+
+    utils.memo.clear()
+    utils.get(f"{stub.url}/statistics", {"taxonid": 3})
+    assert len(stub.requests) == 5
+
+def test_memo_per_session(stub, monkeypatch):
+    """Testing that results fetched through one session or with other options are not reused for another"""
+    monkeypatch.setattr(utils, "memo", utils.Memo())
+    first, second = requests.Session(), requests.Session()
+
+    utils.get(f"{stub.url}/statistics", {"taxonid": 1}, session=first)
+    utils.get(f"{stub.url}/statistics", {"taxonid": 1}, session=first)
+    assert len(stub.requests) == 1
+    utils.get(f"{stub.url}/statistics", {"taxonid": 1}, session=second)
+    assert len(stub.requests) == 2
+    utils.get(f"{stub.url}/statistics", {"taxonid": 1}, session=second, timeout=5)
+    assert len(stub.requests) == 3
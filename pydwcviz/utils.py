@@ -1,17 +1,247 @@
+import copy
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from urllib.parse import urlencode
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import metrics
 obis_base_url = 'https://api.obis.org'
 
-def get(url, args, **kwargs):
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)\
+     Chrome/107.0.0.0 Safari/537.36 Edg/107.0.1418.52",
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+# (connect, read) timeout in seconds applied when the caller does not pass one
+default_timeout = (10, 120)
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with full jitter on the exponential backoff, so that many
+    workers retrying together do not hit the API in lock step.
+    Retry-After headers on 413, 429 and 503 responses still take precedence.
+    """
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+def make_session(retries=5, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504), pool_maxsize=10):
+    """
+    Build a pooled ``requests.Session`` with bounded retries.
+
+    :param retries: [Integer] Maximum number of retries per request.
+    :param backoff_factor: [Float] Base of the exponential backoff between retries, in seconds.
+    :param status_forcelist: [Tuple <Integer>] HTTP status codes that are retried.
+    :param pool_maxsize: [Integer] Number of connections kept alive per host.
+
+    :return: A requests Session
+    """
+    retry = JitteredRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+    out = requests.Session()
+    out.headers.update(headers)
+    out.mount("https://", adapter)
+    out.mount("http://", adapter)
+    return out
+
+# module-level session reused by every get() call, see set_session() and configure_session()
+session = make_session()
+
+def set_session(new_session):
+    """
+    Replace the session used by get(), e.g. with one carrying custom auth or proxies.
+
+    :param new_session: [Session] A ``requests.Session`` instance.
+    """
+    global session
+    session = new_session
+
+def get_session():
+    """Return the session currently used by get()."""
+    return session
+
+def configure_session(**kwargs):
+    """
+    Replace the session used by get() with a new one built by make_session(**kwargs).
+
+    Usage::
+
+        from pydwcviz import utils
+        utils.configure_session(retries=10, backoff_factor=2, pool_maxsize=32)
+    """
+    set_session(make_session(**kwargs))
+
+# opt-in persistent response cache, see set_cache()
+cache = None
+
+def set_cache(response_cache):
+    """
+    Set the persistent cache used by get(), or None to disable caching.
+
+    :param response_cache: [ResponseCache] A ``pydwcviz.cache.ResponseCache`` instance.
+    """
+    global cache
+    cache = response_cache
+
+def get_cache():
+    """Return the persistent cache currently used by get(), None when caching is disabled."""
+    return cache
+
+def canonical_key(url, args):
+    """
+    Identify a request by its URL and query parameters, dropping None values and sorting the rest.
+    """
+    params = sorted((k, str(v)) for k, v in (args or {}).items() if v is not None)
+    return f"{url}?{urlencode(params)}"
+
+class Memo:
+    """
+    In-process LRU of get() results that also shares identical in-flight requests.
+
+    :param maxsize: [Integer] Maximum number of results kept. 0 disables memoization but
+        identical concurrent requests are still coalesced into one.
+    :param ttl: [Float] Seconds a result is reused, None to keep it until evicted.
+
+    Every caller receives its own copy of the decoded JSON, so results can be modified freely.
+    """
+
+    def __init__(self, maxsize=128, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._results = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def call(self, key, func, max_ttl=None):
+        """
+        Return the result stored under ``key``, wait for an identical request in flight,
+        or run ``func()`` and share its result.
+
+        :param max_ttl: [Float] Seconds a stored result is reused at most for this call,
+            capping ``ttl``, e.g. to the TTL of the persistent cache.
+        """
+        ttl = self.ttl
+        if max_ttl is not None:
+            ttl = max_ttl if ttl is None else min(ttl, max_ttl)
+        with self._lock:
+            if key in self._results:
+                stored, value = self._results[key]
+                if ttl is None or time.monotonic() - stored < ttl:
+                    self._results.move_to_end(key)
+                    metrics.count("memo.hit")
+                    return copy.deepcopy(value)
+                del self._results[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            metrics.count("memo.coalesced")
+            return copy.deepcopy(future.result())
+
+        try:
+            value = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            with self._lock:
+                if self.maxsize:
+                    self._results[key] = (time.monotonic(), value)
+                    while len(self._results) > self.maxsize:
+                        self._results.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return copy.deepcopy(value)
+
+    def clear(self):
+        """Forget every memoized result."""
+        with self._lock:
+            self._results.clear()
+
+# in-process memoization of get(), call memo.clear() to force fresh requests
+memo = Memo()
+
+def get(url, args, session=None, memoize=True, cache=True, **kwargs):
     """
     Handles technical details of sending GET request to the API
+
+    Identical requests are answered from the in-process ``memo``, and concurrent identical
+    requests from threads or coroutines share a single network call. Requests are only
+    identical when sent through the same session with the same ``kwargs``. When a persistent
+    cache is set, results are not memoized longer than its TTL for the endpoint, so its
+    expiry and revalidation still apply.
+
+    :param url: [String] URL of the endpoint.
+    :param args: [Dict] Query parameters. None values are left out.
+    :param session: [Session] Session to send the request with instead of the module-level one.
+    :param memoize: [Boolean] Go through the in-process ``memo``. Turn off for large one-off
+        responses, e.g. pages of occurrence records.
+    :param cache: [Boolean] Go through the persistent cache set with set_cache(). Turn off for
+        responses stored elsewhere, so they do not evict useful entries.
+    :param kwargs: Further arguments to ``Session.get``, e.g. ``timeout``.
     """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)\
-         Chrome/107.0.0.0 Safari/537.36 Edg/107.0.1418.52",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Host": "api.obis.org",
-        "Connection": "keep-alive",
-    }
-    out = requests.get(url, params=args, headers=headers, **kwargs)
+    response_cache = get_cache() if cache else None
+    if not memoize:
+        return _fetch(url, args, session, response_cache, **kwargs)
+    max_ttl = response_cache.ttl_for(url) if response_cache is not None else None
+    fetch = partial(_fetch, url, args, session, response_cache, **kwargs)
+    return memo.call(_memo_key(url, args, session, kwargs), fetch, max_ttl)
+
+def _memo_key(url, args, session, kwargs):
+    """Key of a request in the memo: the request, the session sending it and the other options."""
+    session = session if session is not None else get_session()
+    options = tuple(sorted((name, repr(value)) for name, value in kwargs.items()))
+    return canonical_key(url, args), id(session), options
+
+def _fetch(url, args, session=None, cache=None, **kwargs):
+    """
+    Send the request through a persistent cache, if any, and the session.
+    """
+    session = session if session is not None else get_session()
+    kwargs.setdefault("timeout", default_timeout)
+    request_headers = {}
+
+    stored = cache.lookup(url, args) if cache is not None else None
+    if stored is not None:
+        body, fresh, validators = stored
+        if fresh:
+            metrics.count("cache.hit")
+            return _decode(body)
+        request_headers.update(validators)
+
+    with metrics.stage("http.request"):
+        out = session.get(url, params=args, headers=request_headers, **kwargs)
+    metrics.count("http.requests")
+    metrics.count("http.bytes", len(out.content))
+    if stored is not None and out.status_code == 304:
+        metrics.count("cache.revalidated")
+        cache.refresh(url, args)
+        return _decode(body)
     out.raise_for_status()
-    return out.json()
\ No newline at end of file
+
+    if cache is not None:
+        metrics.count("cache.miss")
+        cache.store(url, args, out.content, out.headers.get("ETag"), out.headers.get("Last-Modified"))
+    return _decode(out.content)
+
+def _decode(body):
+    with metrics.stage("json.decode"):
+        return json.loads(body)